@@ -1,11 +1,24 @@
 from .algorithm import (
     heuristic,
-    multistart
+    multistart,
+    parallel_multistart,
+    Solution
 )
 from .utils import (
     normaldist,
     bra,
-    postpone,
     process_input,
     process_output
+)
+from .replication import (
+    replicate,
+    Estimate,
+    heuristic_replication,
+    simulation_replication
+)
+from .tuning import (
+    tune,
+    grid,
+    sample,
+    Candidate
 )
\ No newline at end of file
@@ -20,65 +20,168 @@ Author's website: https://mattianeroni.github.io
 import simpy 
 import asrs 
 import copy 
+import math
+import random
+import collections
+import multiprocessing
+import numpy as np
 
 from .utils import bra, normaldist
-from .exceptions import UnfeasibleSolution
+from .exceptions import UnfeasibleSolution, DominatedSolution
 
 
 def heuristic (jobs, Br_generator, Bb_generator,
         code_prob, depot_prob,
         quantity_prob, quality_prob, 
-        initFilling):
+        initFilling, layout=None, template=None, incumbent=None):
     """
     This method represents a single execution of the algorithm.
+
+    :param layout: The layout of the system (by default the standard one).
+    :param template: A warehouse already warmed up, used as starting point instead 
+                    of building and warming up a new one.
+    :param incumbent: The best makespan found so far. If given, the execution is 
+                    stopped as soon as it cannot improve it (i.e., the simulated time or 
+                    a lower bound of the makespan reaches it), and an infinite makespan 
+                    is returned.
     """
 
     env = simpy.Environment()
 
     Br = Br_generator()
     Bb = Bb_generator()
-
-    sim = asrs.Simulation(
-        env,
-        config = asrs.simulation.Config( Bb = Bb,Br = Br), 
-        shuttles = tuple(asrs.Shuttle(env, 2.0, 0.5, (i*30, 0, 0)) for i in range(4)),
-        racks = tuple(asrs.Rack(ncorridors=30, nlevels=10, corridor_size=4, level_size=1,
-            position=(0, 0, i*12), nshelves=6, shelves_deep=2, shelves_size=2, 
-            crane=asrs.Crane(env, (1.3,1.3,1.3), (0.3,0.3,0.3), (0,10,i*12)),
-            lifts=tuple(asrs.Lift(env, 0.6, 0.3, (j*30, 0, i*12), (j*30, 10, i*12), (j*30, 0, i*12)) for j in range(4))
+    config = asrs.simulation.Config( Bb = Bb,Br = Br)
+
+    if template is not None:
+        sim = template.clone(env, config)
+    else:
+        sim = (layout or asrs.Layout()).build(env, config)
+        sim.warmup (
+            percentage=initFilling,
+            code_prob=code_prob,
+            depot_prob=depot_prob,
+            quantity_prob=quantity_prob,
+            quality_prob=quality_prob,
         )
-        for i in range(3)),
-        depots = tuple(asrs.Depot((i*30, 0, 0)) for i in range(4)),
-        uploadTime = 20.0
-    )
-
-    sim.warmup (
-        percentage=initFilling,
-        code_prob=code_prob,
-        depot_prob=depot_prob,
-        quantity_prob=quantity_prob,
-        quality_prob=quality_prob,
-    )
+
+    if incumbent is not None and not math.isfinite(incumbent):
+        incumbent = None
 
     try:
-        env.process(sim(jobs))
-        env.run()
+        env.process(sim(jobs, incumbent))
+        if incumbent is None:
+            env.run()
+        else:
+            # Step until the simulated time reaches the incumbent (running until it 
+            # would move the clock to the incumbent, and the makespan would be lost)
+            while env.peek() < incumbent:
+                env.step()
+            if env.peek() < float("inf"):
+                raise DominatedSolution()
+        # Jobs still deferred at the end could never be processed
+        if sim.deferred:
+            raise UnfeasibleSolution()
         return env.now 
-    except UnfeasibleSolution:
+    except (UnfeasibleSolution, DominatedSolution):
         return float("inf")
 
 
 def multistart (jobs, maxiter, Br_generator, Bb_generator,
         code_prob, depot_prob,
         quantity_prob, quality_prob, 
-        initFilling):
+        initFilling, layout=None, prune=True, callback=None):
+    """
+    Multistart of the heuristic. The warehouse is warmed up only once, and all 
+    the iterations start from the same inventory.
+
+    :param prune: If True each iteration is stopped as soon as it cannot improve 
+                the best makespan found so far.
+    :param callback: Function called after each iteration with the number of 
+                iterations done and the best makespan so far.
+    """
+    template = asrs.Template(layout or asrs.Layout(), code_prob, depot_prob, quantity_prob, quality_prob, initFilling)
 
-    best_makespan = heuristic(copy.deepcopy(jobs), Br_generator, Bb_generator, code_prob, depot_prob, quantity_prob, quality_prob, initFilling)
+    best_makespan = heuristic([copy.copy(j) for j in jobs], Br_generator, Bb_generator, code_prob, depot_prob, quantity_prob, quality_prob, initFilling, template=template)
+    if callback is not None:
+        callback(1, best_makespan)
     
-    for _ in range(maxiter):
-        makespan = heuristic(copy.deepcopy(jobs), Br_generator, Bb_generator, code_prob, depot_prob, quantity_prob, quality_prob, initFilling)
+    for i in range(maxiter):
+        makespan = heuristic([copy.copy(j) for j in jobs], Br_generator, Bb_generator, code_prob, depot_prob, quantity_prob, quality_prob, initFilling, 
+                            template=template, incumbent=best_makespan if prune else None)
         best_makespan = min(makespan, best_makespan)
+        if callback is not None:
+            callback(i + 2, best_makespan)
 
     return best_makespan
 
 
+
+# The outcome of a single run of the heuristic executed by a worker
+Solution = collections.namedtuple("Solution", ("makespan", "Br", "Bb", "seed"))
+
+
+# The arguments shared by all the runs executed by a worker process
+_worker_args = None
+
+
+def _init_worker (*args):
+    """ Store in the worker process the arguments shared by all the runs """
+    global _worker_args
+    _worker_args = args
+
+
+def _run (seed):
+    """ A single execution of the heuristic inside a worker process """
+    jobs, Br_generator, Bb_generator, code_prob, depot_prob, quantity_prob, quality_prob, initFilling, template, incumbent = _worker_args
+    random.seed(seed)
+    np.random.seed(seed)
+    Br, Bb = Br_generator(), Bb_generator()
+    makespan = heuristic([copy.copy(j) for j in jobs], lambda: Br, lambda: Bb, code_prob, depot_prob, quantity_prob, quality_prob, initFilling, 
+                        template=template, incumbent=incumbent.value if incumbent is not None else None)
+    if incumbent is not None:
+        with incumbent.get_lock():
+            incumbent.value = min(incumbent.value, makespan)
+    return Solution(makespan, Br, Bb, seed)
+
+
+def parallel_multistart (jobs, maxiter, Br_generator, Bb_generator,
+        code_prob, depot_prob,
+        quantity_prob, quality_prob, 
+        initFilling, processes=None, seed=None, layout=None, prune=True):
+    """
+    Parallel version of the multistart. The iterations are spread over a pool 
+    of processes, and every iteration is executed with its own random seed, 
+    derived from the given one, so that any run can be reproduced. As in the 
+    multistart, all the iterations start from the same warmed up warehouse.
+
+    The solutions are yielded as soon as they are found, together with the 
+    best one found so far.
+
+    :param processes: The number of worker processes (by default the number of cores).
+    :param seed: The seed from which the seeds of the single iterations are derived.
+    :param prune: If True each iteration is stopped as soon as it cannot improve the 
+                best makespan found so far by any worker, and its makespan is infinite.
+    :return: A generator of couples (solution, best solution).
+    """
+    sequence = np.random.SeedSequence(seed)
+    seeds = tuple(int(i) for i in sequence.generate_state(maxiter + 1))
+    # The template is filled with a seed of its own, independent of the iterations, 
+    # and the state of the random generators of the caller is restored afterwards
+    template_seed = int(sequence.spawn(1)[0].generate_state(1)[0])
+    state, np_state = random.getstate(), np.random.get_state()
+    try:
+        random.seed(template_seed)
+        np.random.seed(template_seed)
+        template = asrs.Template(layout or asrs.Layout(), code_prob, depot_prob, quantity_prob, quality_prob, initFilling)
+    finally:
+        random.setstate(state)
+        np.random.set_state(np_state)
+    incumbent = multiprocessing.Value("d", float("inf")) if prune else None
+    initargs = (jobs, Br_generator, Bb_generator, code_prob, depot_prob, quantity_prob, quality_prob, initFilling, template, incumbent)
+
+    best = None
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        for solution in pool.imap_unordered(_run, seeds):
+            if best is None or solution.makespan < best.makespan:
+                best = solution
+            yield solution, best
@@ -20,4 +20,9 @@ Author's website: https://mattianeroni.github.io
 
 class UnfeasibleSolution(Exception):
     def __init__(self):
-        self.message = "Unfeasible solution found."
\ No newline at end of file
+        self.message = "Unfeasible solution found."
+
+
+class DominatedSolution(Exception):
+    def __init__(self):
+        self.message = "The solution cannot improve the best one found so far."
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import copy
+import math
+import time
+import random
+import statistics
+import simpy
+import numpy as np
+
+import asrs
+from asrs import metrics as _metrics
+from asrs.metrics import Statistic
+
+from typing import Callable, Dict, Optional
+
+from .algorithm import heuristic
+
+
+# Reasons why the replications stopped
+PRECISION = "precision"
+BUDGET = "budget"
+MAXREP = "maxrep"
+UNFEASIBLE = "unfeasible"
+
+
+
+def makespan (sim) -> float:
+    """ The time at which the last job is completed """
+    return sim.env.now
+
+
+def cycle_time (sim) -> float:
+    """ The average cycle time of the completed jobs (inputs and outputs) """
+    stats = sim.metrics.cycle_times.values()
+    count = sum(s.count for s in stats)
+    return sum(s.count * s.mean for s in stats) / count if count > 0 else 0.0
+
+
+def queue_length (sim) -> float:
+    """ The time-average length of the queues of the depots (averaged among the depots) """
+    horizon = sim.env.now
+    return sum(depot.mean_queue(horizon) for depot in sim.depots) / len(sim.depots)
+
+
+# The KPIs that can be estimated on a simulation
+KPIS = {"makespan" : makespan, "cycle_time" : cycle_time, "queue_length" : queue_length}
+
+
+
+# Degrees of freedom above which the quantiles of the t distribution are approximated
+_EXACT_DOF = 200
+
+
+def _t_cdf (t: float, dof: int) -> float:
+    """
+    The cumulative distribution function of the Student's t distribution for 
+    t >= 0, in closed form for integer degrees of freedom (Abramowitz and 
+    Stegun, 26.7.3 and 26.7.4).
+    """
+    theta = math.atan(t / math.sqrt(dof))
+    s, c2 = math.sin(theta), math.cos(theta) ** 2
+    if dof % 2 == 1:
+        term, total = 1.0, 1.0
+        for k in range(2, dof - 1, 2):
+            term *= c2 * k / (k + 1)
+            total += term
+        a = 2 / math.pi * (theta + (s * math.cos(theta) * total if dof > 1 else 0.0))
+    else:
+        term, total = 1.0, 1.0
+        for k in range(1, dof - 2, 2):
+            term *= c2 * k / (k + 1)
+            total += term
+        a = s * total
+    # a is the probability of |T| < t
+    return 0.5 + a / 2
+
+
+def t_quantile (p: float, dof: int) -> float:
+    """
+    The p-quantile (with p > 0.5) of the Student's t distribution with `dof` degrees 
+    of freedom. Up to 200 degrees of freedom the distribution function is inverted 
+    by bisection (error below 1e-9), while beyond that the Cornish-Fisher expansion 
+    around the normal quantile is used (error below 1e-8).
+    """
+    assert 0.5 < p < 1, "Only the quantiles of the upper half are supported."
+    z = statistics.NormalDist().inv_cdf(p)
+    if dof > _EXACT_DOF:
+        g1 = (z**3 + z) / 4
+        g2 = (5*z**5 + 16*z**3 + 3*z) / 96
+        g3 = (3*z**7 + 19*z**5 + 17*z**3 - 15*z) / 384
+        g4 = (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z) / 92160
+        return z + g1/dof + g2/dof**2 + g3/dof**3 + g4/dof**4
+    if dof == 1:
+        return math.tan(math.pi * (p - 0.5))
+
+    # The t quantile is larger than the normal one, so the search starts from there
+    lo, hi = z, 2 * z
+    while _t_cdf(hi, dof) < p:
+        lo, hi = hi, 2 * hi
+    while hi - lo > 1e-10 * hi:
+        mid = (lo + hi) / 2
+        if _t_cdf(mid, dof) < p:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+
+class Estimate (object):
+    """
+    An instance of this class is the estimate of a KPI obtained by independent
+    replications, with the confidence interval of its mean. Unfeasible 
+    replications (i.e., infinite values) are counted but not included, and if 
+    they are too many the estimate is flagged as unfeasible.
+    """
+    def __init__(self, confidence: float = 0.95):
+        self.confidence = confidence
+        self.statistic = Statistic(keep=True)
+        self.unfeasible = 0
+        self.seeds = []
+        self.stopped = None
+        self.elapsed = 0.0
+
+
+    def add (self, value: float, seed: Optional[int] = None) -> None:
+        self.seeds.append(seed)
+        if math.isfinite(value):
+            self.statistic.add(value)
+        else:
+            self.unfeasible += 1
+
+
+    @property
+    def count (self) -> int:
+        return self.statistic.count
+
+    @property
+    def feasible (self) -> bool:
+        return self.stopped != UNFEASIBLE
+
+    @property
+    def mean (self) -> float:
+        return self.statistic.mean
+
+    @property
+    def halfwidth (self) -> float:
+        """ The half-width of the confidence interval of the mean """
+        n = self.statistic.count
+        if n < 2:
+            return float("inf")
+        std = math.sqrt(self.statistic.m2 / (n - 1))
+        return t_quantile(0.5 + self.confidence / 2, n - 1) * std / math.sqrt(n)
+
+
+    def report (self) -> Dict:
+        result = self.statistic.report()
+        result.update(confidence=self.confidence, halfwidth=self.halfwidth, replications=len(self.seeds),
+                      unfeasible=self.unfeasible, feasible=self.feasible, stopped=self.stopped, elapsed=self.elapsed)
+        return result
+
+
+
+def replicate (run: Callable[[int], float], halfwidth: float, *, relative: bool = False, 
+               confidence: float = 0.95, minrep: int = 5, maxrep: Optional[int] = None, 
+               budget: Optional[float] = None, maxshare: float = 0.5, seed: Optional[int] = None) -> Estimate:
+    """
+    Sequential replication controller. Independent replications are executed until 
+    the confidence interval of the mean of the KPI is narrower than the required 
+    half-width, or the time budget runs out, or the maximum number of replications 
+    is reached. After `minrep` replications, the estimate is also given up (and 
+    flagged as unfeasible) as soon as the unfeasible replications are more than 
+    `maxshare` of them.
+
+    :param run: The replication, which receives a seed and returns the value of the KPI.
+    :param halfwidth: The target half-width of the confidence interval.
+    :param relative: If True the half-width is relative to the mean (e.g., 0.01 for 1%).
+    :param confidence: The confidence level of the interval.
+    :param minrep: The minimum number of replications before checking the interval.
+    :param maxrep: The maximum number of replications (by default unlimited).
+    :param budget: The time budget in seconds (by default unlimited).
+    :param maxshare: The maximum share of unfeasible replications.
+    :param seed: The seed from which the seeds of the single replications are derived.
+    :return: The estimate of the KPI.
+    """
+    assert maxrep is not None or budget is not None or halfwidth > 0, "The replications would never stop."
+    assert 0 <= maxshare < 1, "The maximum share of unfeasible replications must be in [0, 1)."
+    estimate = Estimate(confidence)
+    sequence = np.random.SeedSequence(seed)
+    start = time.perf_counter()
+
+    while True:
+        replication_seed = int(sequence.spawn(1)[0].generate_state(1)[0])
+        estimate.add(run(replication_seed), replication_seed)
+        estimate.elapsed = time.perf_counter() - start
+
+        runs = len(estimate.seeds)
+        target = halfwidth * abs(estimate.mean) if relative else halfwidth
+        if runs >= minrep and estimate.unfeasible > maxshare * runs:
+            estimate.stopped = UNFEASIBLE
+        elif estimate.count >= max(minrep, 2) and estimate.halfwidth <= target:
+            estimate.stopped = PRECISION
+        elif budget is not None and estimate.elapsed >= budget:
+            estimate.stopped = BUDGET
+        elif maxrep is not None and runs >= maxrep:
+            estimate.stopped = MAXREP
+        if estimate.stopped is not None:
+            return estimate
+
+
+
+def heuristic_replication (jobs, Br_generator, Bb_generator, code_prob, depot_prob,
+                           quantity_prob, quality_prob, initFilling, template=None) -> Callable[[int], float]:
+    """ A replication of the heuristic, whose KPI is the makespan """
+    def run (seed: int) -> float:
+        random.seed(seed)
+        np.random.seed(seed)
+        return heuristic([copy.copy(j) for j in jobs], Br_generator, Bb_generator, code_prob, depot_prob, 
+                         quantity_prob, quality_prob, initFilling, template=template)
+    return run
+
+
+
+def simulation_replication (source: Callable, kpi: str, config, code_prob, depot_prob,
+                            quantity_prob, quality_prob, initFilling, layout=None, **kwargs) -> Callable[[int], float]:
+    """
+    A replication of the simulation, where both the warehouse and the jobs 
+    are generated again with the seed of the replication.
+
+    :param source: The generator of the jobs (e.g., a partial of asrs.source.source).
+    :param kpi: The name of the KPI (see KPIS).
+    :param kwargs: Other parameters of the simulation.
+    """
+    measure, layout = KPIS[kpi], layout or asrs.Layout()
+    def run (seed: int) -> float:
+        random.seed(seed)
+        np.random.seed(seed)
+        env = simpy.Environment()
+        sim = layout.build(env, config, metrics=_metrics.SUMMARY, **kwargs)
+        sim.warmup(percentage=initFilling, code_prob=code_prob, depot_prob=depot_prob, 
+                   quantity_prob=quantity_prob, quality_prob=quality_prob)
+        env.process(sim(source()))
+        env.run()
+        return measure(sim)
+    return run
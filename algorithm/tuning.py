@@ -0,0 +1,106 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import copy
+import random
+import itertools
+import collections
+import numpy as np
+
+import asrs
+
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from .algorithm import heuristic
+from .replication import Estimate
+
+
+# A setting of the biased-randomisation parameters with the estimate of its makespan
+Candidate = collections.namedtuple("Candidate", ("Br", "Bb", "estimate"))
+
+
+def grid (Br_values: Sequence[float], Bb_values: Sequence[float]) -> List[Tuple[float, float]]:
+    """ All the combinations of the given values of Br and Bb """
+    return list(itertools.product(Br_values, Bb_values))
+
+
+def sample (n: int, low: float = 0.05, high: float = 0.95, seed: Optional[int] = None) -> List[Tuple[float, float]]:
+    """ n settings of Br and Bb drawn uniformly in [low, high) """
+    rng = np.random.default_rng(seed)
+    return [tuple(pair) for pair in rng.uniform(low, high, (n, 2)).tolist()]
+
+
+def _score (candidate: Candidate) -> Tuple[float, float]:
+    """ Candidates are ranked by their share of unfeasible runs first, and then by mean makespan """
+    estimate = candidate.estimate
+    runs = len(estimate.seeds)
+    return (estimate.unfeasible / runs if runs > 0 else 1.0, 
+            estimate.mean if estimate.count > 0 else float("inf"))
+
+
+def tune (jobs, settings: Iterable[Tuple[float, float]], code_prob, depot_prob, 
+          quantity_prob, quality_prob, initFilling, *, replications: int = 2, 
+          eta: int = 2, layout=None, seed: Optional[int] = None) -> Tuple[Candidate, List[Candidate]]:
+    """
+    Successive halving tuner of Br and Bb. In each round every surviving setting 
+    is evaluated with more runs of the heuristic, and only the best 1/eta of them 
+    survive. The number of runs per setting grows by eta every round, so most of 
+    the budget is spent on the promising settings.
+
+    All the settings are evaluated on the same seeds (common random numbers), 
+    and starting from the same warmed up warehouse, so that they are compared 
+    on equal terms.
+
+    :param settings: The couples (Br, Bb) to explore (see grid and sample).
+    :param replications: The runs per setting in the first round.
+    :param eta: The reduction factor of each round.
+    :param seed: The seed from which the seeds of the runs are derived.
+    :return: The best candidate, and all the candidates sorted from best to worst.
+    """
+    assert eta >= 2, "The reduction factor must be at least 2."
+    template = asrs.Template(layout or asrs.Layout(), code_prob, depot_prob, quantity_prob, quality_prob, initFilling)
+    sequence = np.random.SeedSequence(seed)
+    seeds = []
+
+    candidates = [Candidate(Br, Bb, Estimate()) for Br, Bb in settings]
+    assert candidates, "No settings to explore."
+    alive, runs = list(candidates), replications
+
+    while True:
+        # Seeds are shared among the settings, and new ones are added only when needed
+        while len(seeds) < runs:
+            seeds.append(int(sequence.spawn(1)[0].generate_state(1)[0]))
+
+        for candidate in alive:
+            for s in seeds[len(candidate.estimate.seeds):runs]:
+                random.seed(s)
+                np.random.seed(s)
+                makespan = heuristic([copy.copy(j) for j in jobs], lambda: candidate.Br, lambda: candidate.Bb, 
+                                     code_prob, depot_prob, quantity_prob, quality_prob, initFilling, template=template)
+                candidate.estimate.add(makespan, s)
+
+        alive.sort(key=_score)
+        if len(alive) == 1:
+            break
+        alive = alive[:max(1, len(alive) // eta)]
+        runs *= eta
+
+    # The survivors come first (they have more runs), then the others by round of elimination
+    ranking = sorted(candidates, key=lambda c: (-len(c.estimate.seeds), _score(c)))
+    return alive[0], ranking
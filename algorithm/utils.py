@@ -20,81 +20,130 @@ Author's website: https://mattianeroni.github.io
 import numpy as np 
 import random 
 import math 
-import itertools 
 import operator
+import bisect
+import collections
 
 from asrs.source import Job, Bundle
-from asrs.kind import INPUT, OUTPUT
 from asrs import Rack
 from asrs.location import Location
 
-from typing import Sequence, List, Any, Union, Generator, Tuple, Iterable, Set
-
-from .exceptions import UnfeasibleSolution
+from typing import Sequence, List, Any, Union, Generator, Tuple, Iterable, Collection
 
 Array = Any
 
 
 
 
-def normaldist (mu: float, sigma: float, n: int = 1) -> Union[Array, int]:
+def normaldist (mu: float, sigma: float, n: int = 1) -> Union[Array, float]:
+    """ A single value (as a float) or an array of n values drawn from a normal distribution """
+    if n == 1:
+        return float(np.random.normal(mu, sigma))
     return np.random.normal(mu, sigma, n)
 
 
-def bra (options: List, beta: float) -> Generator[Any, None, None]:
-    L, _options = len(options), list(options)
-    for _ in range(L):
-        idx = int(math.log(random.random(), 1.0 - beta)) % len(_options)
-        yield _options.pop(idx)
-
-
-def postpone(id: int, job: Job, jobs: List[Job]) -> int:
-    
-    if job.kind == INPUT:
-        # Get the position of the next job that is freeing a space 
-        # big enough to host the entering bundles that have been postponed
-        position = next( (i for i, j in enumerate(jobs[id+1:], start=id+1) if (
-                                                                        j.kind == OUTPUT and  
-                                                                        j.length >= job.length and 
-                                                                        j.quantity >= job.quantity    
-                                                                    ) ) , None)
-        # If no position is found the solution is marked as unfeasible.
-        if position is None:
-            raise UnfeasibleSolution()
-        # Otherwise, the job is postponed after the output that freed the space.
-        return position + 1
-    
-    elif job.kind == OUTPUT:
-        # Get teh position of the next entering job that stores the required product
-        position = next( (i for i, j in enumerate(jobs[id+1:], start=id+1) if j.kind == INPUT and  j.code == job.code ) , None)
-        # If no position is found the solution is marked as unfeasible.
-        if position is None:
-            raise UnfeasibleSolution()
-        # Otherwise, the job is postponed.
-        return position + 1
+# Number of taken options above which bra stops scanning them
+_SCAN_LIMIT = 16
+# Number of options above which bra uses a Fenwick tree instead of popping from a list
+_TREE_LIMIT = 1 << 15
+
+
+class _Remaining (object):
+    """ 
+    Fenwick tree over the positions of a sequence, counting the positions 
+    not taken yet, to find the k-th remaining one in O(log n).
+    """
+    __slots__ = ("size", "tree", "top")
+
+    def __init__(self, size: int, taken: Iterable[int] = ()):
+        self.size = size
+        # With all the positions present, each node counts the lowest bit of its index
+        self.tree = [i & -i for i in range(size + 1)]
+        self.top = 1 << (size.bit_length() - 1) if size > 0 else 0
+        for pos in taken:
+            self.take(pos)
+
+    def take (self, pos: int) -> None:
+        tree, size = self.tree, self.size
+        i = pos + 1
+        while i <= size:
+            tree[i] -= 1
+            i += i & -i
+
+    def find (self, k: int) -> int:
+        """ The position of the k-th (from 0) remaining element """
+        tree, size = self.tree, self.size
+        pos, bit = 0, self.top
+        while bit:
+            nxt = pos + bit
+            if nxt <= size and tree[nxt] <= k:
+                pos = nxt
+                k -= tree[nxt]
+            bit >>= 1
+        return pos
+
+
+
+def bra (options: Sequence, beta: float) -> Generator[Any, None, None]:
+    """
+    Biased-randomised selection without replacement: the index of each option 
+    among the remaining ones follows a geometric distribution, wrapped around 
+    the number of remaining options.
+
+    The options are not copied up front: the first taken positions are skipped 
+    by a scan, so who stops early pays only for what it takes. After a few draws 
+    the remaining options are either compacted into a list to pop from, or, when 
+    they are very many, tracked by a Fenwick tree (O(log n) per draw). Popping 
+    is quadratic, but it is faster than the tree up to tens of thousands of options.
+    """
+    _options = options if isinstance(options, (list, tuple)) else list(options)
+    taken, tree = [], None
+    # Short sequences are simply copied
+    rest = list(_options) if len(_options) <= _SCAN_LIMIT else None
+    for n in range(len(_options), 0, -1):
+        idx = int(math.log(random.random(), 1.0 - beta)) % n
+        if rest is not None:
+            yield rest.pop(idx)
+            continue
+        if tree is not None:
+            idx = tree.find(idx)
+            tree.take(idx)
+            yield _options[idx]
+            continue
+
+        for pos in taken:
+            if pos > idx:
+                break
+            idx += 1
+        bisect.insort(taken, idx)
+        yield _options[idx]
+
+        if len(taken) > _SCAN_LIMIT:
+            if len(_options) > _TREE_LIMIT:
+                tree = _Remaining(len(_options), taken)
+            else:
+                skip = set(taken)
+                rest = [o for i, o in enumerate(_options) if i not in skip]
 
 
 
 def process_input (job: Job, racks: Iterable[Rack], Br: float) -> Tuple[Rack, Location]:
     for rack in bra(sorted(racks, key=lambda rack: ( len(rack.crane.users), len(rack.crane.queue)  )), beta=Br):
-        locs = [i for i in rack.locations if not i.frozen]
-        random.shuffle(locs)
-        for loc in locs:
-            if loc.place(job):
-                loc.frozen = True 
-                return rack, loc 
+        loc = rack.capacity.sample(job.length, job.quantity)
+        if loc is not None and loc.place(job):
+            loc.frozen = True 
+            return rack, loc 
     return None, None
 
 
-def _can_retrieve(bundle: Bundle, taken_bundles: Set[Bundle]):
+def _can_retrieve(bundle: Bundle, taken_bundles: Collection[Bundle]):
     if bundle.deep == 0:
         return True 
     
     loc = bundle.loc  
     # Check obstruction
     for i in loc.items[0]:
-        if (type(i) == Bundle and 
-            i not in taken_bundles and 
+        if (i not in taken_bundles and 
             ( (i.start <= bundle.start and i.end >= bundle.start) or  (i.start <= bundle.end and i.end >= bundle.end)  )
         ):
             return False 
@@ -102,23 +151,34 @@ def _can_retrieve(bundle: Bundle, taken_bundles: Set[Bundle]):
 
 
 
-def _aggregate(job: Job, bundles: Set[Bundle]) -> List[Job]:
-    b = set(bundles)
-    jobs = [] 
-    for i, j in itertools.combinations(b, 2):
-        if not i.taken and not j.taken and i.loc == j.loc and i.start == j.start:
-            i.taken = True 
-            j.taken = True 
-            newjob = Job(job.arrival, job.depot, job.kind, job.code, job.length, i.weight + j.weight, (i.quality + j.quality) / 2, 2 )
-            newjob.bundles = tuple(sorted([i, j], key=operator.attrgetter("deep")))
-            jobs.append(newjob)
-    
+def _aggregate(job: Job, bundles: Iterable[Bundle]) -> List[Job]:
+    """
+    Split an output job into the jobs retrieving the given bundles. Bundles at 
+    the same start of the same location (one behind the other) are retrieved 
+    together in a single job, sorted by deep, while the others are retrieved alone.
+    """
+    groups = collections.defaultdict(list)
     for i in bundles:
         i.loc.frozen = True
-        if not i.taken:
-            newjob = Job(job.arrival, job.depot, job.kind, job.code, job.length, i.weight, i.quality, 1 )
-            newjob.bundles = (i, )
-            jobs.append(newjob)
+        groups[(i.loc, i.start)].append(i)
+
+    jobs, singles = [], []
+    for group in groups.values():
+        if len(group) > 1:
+            group.sort(key=operator.attrgetter("deep"))
+            for i, j in zip(group[0::2], group[1::2]):
+                i.taken = True 
+                j.taken = True 
+                newjob = Job(job.arrival, job.depot, job.kind, job.code, job.length, i.weight + j.weight, (i.quality + j.quality) / 2, 2 )
+                newjob.bundles = (i, j)
+                jobs.append(newjob)
+        if len(group) % 2 == 1:
+            singles.append(group[-1])
+
+    for i in singles:
+        newjob = Job(job.arrival, job.depot, job.kind, job.code, job.length, i.weight, i.quality, 1 )
+        newjob.bundles = (i, )
+        jobs.append(newjob)
 
     return jobs 
 
@@ -128,17 +188,15 @@ def process_output (job: Job, racks: Iterable[Rack], Br: float, Bb: float, weigh
     total_weight = 0 
     total_quality = 0 
     bundles_count = 0
-    taken_bundles = set()
+    # The bundles taken so far, in the order they were taken (used as an ordered set)
+    taken_bundles = {}
     for rack in bra(sorted(racks, key=lambda rack: (len(rack.crane.users), len(rack.crane.queue))), beta=Br):
         
-        bundles = tuple( bundle
-            for loc in rack.locations if not loc.frozen 
-            for bundle in loc.items[0] + loc.items[1] if type(bundle) == Bundle and bundle.code == job.code
-        )
+        bundles = tuple( bundle for bundle in rack.inventory.get(job.code, rack) if not bundle.loc.frozen )
 
         for bundle in bra(sorted(bundles, key= lambda i: (- i.quality, i.weight)), beta=Bb):
             if _can_retrieve(bundle, taken_bundles):
-                taken_bundles.add(bundle)
+                taken_bundles[bundle] = None
                 bundle.taken = False
                 total_weight += bundle.weight 
                 total_quality += bundle.quality 
@@ -19,11 +19,14 @@ Author's website: https://mattianeroni.github.io
 """
 import dash
 import dash_table
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_html_components as html
+import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 
 import asrs
+import runs
 from asrs.kind import INPUT, OUTPUT
 import simpy
 
@@ -31,6 +34,21 @@ import simpy
 app = dash.Dash(__name__, serve_locally=True)
 app.title = "Shuttle Lift Crane AS/RS"
 
+# The simulations and the multistarts are executed in background processes, 
+# started the first time they are needed (also when served by a WSGI server)
+background = None
+
+
+def runner () -> runs.Runs:
+    """ The runner of the background runs """
+    global background
+    if background is None:
+        background = runs.Runs(cache=asrs.Cache())
+    return background
+
+# Milliseconds between two updates of the progress of a run
+POLLING = 2000
+
 
 
 app.layout = html.Div([
@@ -71,12 +89,74 @@ app.layout = html.Div([
             {"Type" : "OUTPUT", "Probability" : 0.25,"ShuttleSpeed" : 2.0, "ShuttleAcceleration" : .5}
         ]
     ),
-
+    html.Br(),
+    dbc.Row([html.Button("Simulate",id="simulate",n_clicks=0), html.Button("Optimize",id="optimize",n_clicks=0)]),
+    html.Div(id="run-progress"),
+    # The id of the run of this user, and the timer to poll its progress
+    dcc.Store(id="run-id"),
+    dcc.Interval(id="run-polling", interval=POLLING, disabled=True),
 
 ])
 
 
 
+@app.callback(
+    Output("run-id", "data"), 
+    Input("simulate", "n_clicks"), 
+    Input("optimize", "n_clicks"),
+    State("general-table", "data"), 
+    State("depots-table", "data"),
+    State("run-id", "data"),
+)
+def submit (simulate, optimize, general, depots, run_id):
+    """ Submit a new run in background (the previous run of the user is stopped) """
+    if not simulate and not optimize:
+        raise PreventUpdate
+    button = dash.callback_context.triggered[0]["prop_id"].split(".")[0]
+    if run_id is not None:
+        runner().forget(run_id)
+    kind = runs.SIMULATION if button == "simulate" else runs.MULTISTART
+    return runner().submit(kind, runs.scenario(general[0], depots))
+
+
+
+@app.callback(
+    Output("run-progress", "children"), 
+    Output("run-polling", "disabled"),
+    Input("run-id", "data"),
+    Input("run-polling", "n_intervals"),
+)
+def poll (run_id, n_intervals):
+    """ 
+    Show the progress of the run. Polling starts when a run is submitted, 
+    and it stops once the run is over.
+    """
+    if run_id is None:
+        raise PreventUpdate
+    status = runner().status(run_id)
+    state = status.get("state")
+
+    if state == runs.QUEUED:
+        return "Waiting for a free worker...", False
+    if state == runs.FAILED:
+        return f"The run failed: {status['error']}", True
+    if state == runs.DONE:
+        result = status["result"]
+        if "makespan" in result:
+            return f"Best makespan found in {result['iterations']} iterations: {result['makespan']:.0f} s", True
+        return f"Simulation completed at {result['horizon'] / runs.DAY:.2f} days ({result['postponed']} postponed jobs)", True
+    if "horizon" in status:
+        share = min(1.0, status["now"] / status["horizon"])
+        return f"Simulated {status['now'] / runs.DAY:.2f} days of {status['horizon'] / runs.DAY:.2f} ({share:.0%})", False
+    if "total" in status:
+        best = f", best makespan {status['best']:.0f} s" if status["best"] is not None else ""
+        return f"Completed {status['done']} of {status['total']} iterations{best}", False
+    if state == runs.RUNNING:
+        return "Starting...", False
+    return "The run is no longer available.", True
+
+
+
 if __name__ == '__main__':
     app.run_server(debug=True, host='0.0.0.0', port=8000)
 
@@ -1,4 +1,6 @@
 from .machine import Shuttle, Lift, Crane, Depot
 from .rack import Rack
 from .simulation import Simulation, Config
-
+from .layout import Layout, Template
+from .cache import Cache
+from .events import EventLog
@@ -0,0 +1,207 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import os
+import json
+import pickle
+import random
+import hashlib
+import tempfile
+import functools
+import numpy as np
+
+from typing import Any, Callable, Optional
+
+from .source import Code, Job
+from .layout import Layout, Template
+from .simulation import Config
+
+
+# The value returned by get when a key is missing
+_MISSING = object()
+
+# Version of the cached results, part of every key. The keys already include the 
+# hash of the sources of this package, so any change of the simulation invalidates 
+# the cache on its own; this number must be increased by hand when a change outside 
+# the package (e.g., in the algorithm or in the scripts) changes the results of the 
+# same configuration.
+CACHE_VERSION = 1
+
+
+
+def canonical (obj: Any) -> Any:
+    """
+    The canonical form of a configuration: a structure of lists, strings and numbers 
+    that does not depend on the identity of the objects or on the order of the 
+    dictionaries and sets. Functions are described by their qualified name, so 
+    lambdas and nested functions cannot be part of a configuration.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return ["ndarray", str(obj.dtype), list(obj.shape), obj.tolist()]
+    if isinstance(obj, (tuple, list)):
+        return ["seq", [canonical(i) for i in obj]]
+    if isinstance(obj, dict):
+        items = [[canonical(k), canonical(v)] for k, v in obj.items()]
+        return ["dict", sorted(items, key=json.dumps)]
+    if isinstance(obj, (set, frozenset)):
+        return ["set", sorted((canonical(i) for i in obj), key=json.dumps)]
+    if isinstance(obj, Code):
+        return ["Code", obj.length, obj.weight]
+    if isinstance(obj, Job):
+        return ["Job", obj.arrival, obj.depot, obj.kind, canonical(obj.code), obj.length, obj.weight, obj.quality, obj.quantity]
+    if isinstance(obj, (Layout, Config)):
+        return [type(obj).__name__, canonical(vars(obj))]
+    if isinstance(obj, Template):
+        return ["Template", canonical(obj.layout), canonical(obj.snapshot)]
+    if isinstance(obj, functools.partial):
+        return ["partial", canonical(obj.func), canonical(obj.args), canonical(obj.keywords)]
+    if callable(obj) and hasattr(obj, "__qualname__"):
+        if "<" in obj.__qualname__:
+            raise TypeError(f"{obj.__qualname__} has no stable name and it cannot be part of a cached configuration.")
+        return ["function", obj.__module__, obj.__qualname__]
+    raise TypeError(f"Objects of type {type(obj).__name__} cannot be part of a cached configuration.")
+
+
+
+@functools.lru_cache(maxsize=None)
+def sources () -> str:
+    """ The hash of the sources of the package (computed once per process) """
+    digest = hashlib.sha256()
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".py"):
+            digest.update(name.encode())
+            with open(os.path.join(folder, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+
+def key (*parts) -> str:
+    """ 
+    The hash of the canonical form of a configuration, together with the version 
+    of the cache and the hash of the sources of the package, so that the results 
+    produced by a different version of the code are never returned. 
+    """
+    text = json.dumps([CACHE_VERSION, sources(), canonical(parts)], separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+
+class Cache (object):
+    """
+    Content-addressed cache of results on the local disk. Each result is stored 
+    in a file named after the hash of the configuration that produced it, and the 
+    least recently used results are evicted when the size of the cache exceeds 
+    `maxsize` bytes. The last access is the modification time of the files, so 
+    more processes can share the same cache.
+
+    The results of an older version of the code are never returned, since the keys 
+    change with the sources of the package and with CACHE_VERSION (see key). They 
+    are not removed either, but they are the least recently used and they are the 
+    first to be evicted; clear removes them at once.
+    """
+    def __init__(self, path: str = ".asrs-cache", maxsize: int = 1 << 30):
+        self.path = path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+
+    def _file (self, k: str) -> str:
+        return os.path.join(self.path, k + ".pkl")
+
+
+    def __contains__ (self, k: str) -> bool:
+        return os.path.exists(self._file(k))
+
+
+    def get (self, k: str, default: Any = None) -> Any:
+        """ The result stored under a key (or the default), which becomes the most recently used """
+        file = self._file(k)
+        try:
+            with open(file, "rb") as f:
+                value = pickle.load(f)
+            os.utime(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+
+    def put (self, k: str, value: Any) -> None:
+        """ Store a result, and evict the least recently used ones if the cache is too big """
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._file(k))
+        self.evict()
+
+
+    def evict (self) -> None:
+        """ Remove the least recently used results until the cache fits into maxsize """
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(e[1] for e in entries)
+        for _, bytes_, path in sorted(entries):
+            if size <= self.maxsize:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= bytes_
+
+
+    def clear (self) -> None:
+        for entry in os.scandir(self.path):
+            if entry.name.endswith((".pkl", ".tmp")):
+                os.remove(entry.path)
+
+
+    def call (self, function: Callable, *args, seed: Optional[int] = None, **kwargs) -> Any:
+        """
+        Call a function through the cache. The random generators are seeded before 
+        the call, so that the result only depends on the configuration and on the seed.
+
+        :param seed: The seed of the call (if None, the cache is bypassed, since 
+                    the result would be different every time).
+        """
+        if seed is None:
+            return function(*args, **kwargs)
+        k = key(function, args, kwargs, seed)
+        if (value := self.get(k, _MISSING)) is not _MISSING:
+            return value
+        random.seed(seed)
+        np.random.seed(seed)
+        value = function(*args, **kwargs)
+        self.put(k, value)
+        return value
@@ -0,0 +1,93 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import random
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class Capacity (object):
+    """ 
+    An instance of this class is an index of the locations of a rack which 
+    are not frozen, bucketed by the length of the longest bundles they can 
+    host, for each possible quantity of bundles (i.e., one or two). 
+    The index is kept updated by the locations every time some bundles are 
+    placed or taken, and every time they are frozen or unfrozen.
+    """
+    QUANTITIES = (1, 2)
+
+    def __init__(self, locations: Sequence):
+        length = max((loc.length for loc in locations), default=0)
+        self.buckets: Dict[int, List[List]] = {q: [[] for _ in range(length + 1)] for q in self.QUANTITIES}
+        self.keys: Dict[object, Tuple[int, ...]] = {}
+        self.positions: Dict[Tuple[int, object], int] = {}
+        for loc in locations:
+            self.update(loc)
+
+
+    def _insert (self, quantity: int, span: int, loc) -> None:
+        bucket = self.buckets[quantity][span]
+        self.positions[quantity, loc] = len(bucket)
+        bucket.append(loc)
+
+
+    def _remove (self, quantity: int, span: int, loc) -> None:
+        # swap the location with the last one of the bucket and pop it
+        bucket = self.buckets[quantity][span]
+        idx = self.positions.pop((quantity, loc))
+        last = bucket.pop()
+        if last is not loc:
+            bucket[idx] = last
+            self.positions[quantity, last] = idx
+
+
+    def update (self, loc) -> None:
+        """ Method to move a location in the right buckets after a change of its state """
+        old = self.keys.get(loc, (0,) * len(self.QUANTITIES))
+        new = (0,) * len(self.QUANTITIES) if loc.frozen else tuple(loc.capacity(q) for q in self.QUANTITIES)
+        if new == old:
+            return
+        for q, o, n in zip(self.QUANTITIES, old, new):
+            if o != n:
+                if o > 0:
+                    self._remove(q, o, loc)
+                if n > 0:
+                    self._insert(q, n, loc)
+        self.keys[loc] = new
+
+
+    def count (self, length: int, quantity: int) -> int:
+        """ Method to get the number of locations where `quantity` bundles long `length` can be placed """
+        return sum(len(bucket) for bucket in self.buckets[quantity][length:])
+
+
+    def sample (self, length: int, quantity: int) -> Optional[object]:
+        """ 
+        Method to pick uniformly at random one of the locations where `quantity` 
+        bundles long `length` can be placed. 
+        """
+        buckets = self.buckets[quantity][length:]
+        total = sum(len(bucket) for bucket in buckets)
+        if total == 0:
+            return None
+        r = random.randrange(total)
+        for bucket in buckets:
+            if r < len(bucket):
+                return bucket[r]
+            r -= len(bucket)
@@ -0,0 +1,137 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import io
+import re
+import csv
+import zipfile
+import itertools
+import contextlib
+import numpy as np
+
+from typing import Dict, Generator, List, Optional, TextIO
+
+from asrs import kind
+from .source import Job, Code
+
+
+# The columns of the datasets (the headers are recognised by their first word,
+# e.g. "TYPE (0 IN / 1 OUT)" or "LENGTH (n shelves)").
+TYPE = "TYPE"
+BAY = "BAY"
+QUALITY = "QUALITY"
+QUANTITY = "QUANTITY"
+LENGTH = "LENGTH"
+ARRIVAL = "ARRIVAL"
+
+# The values of the TYPE column
+TYPES = {0: kind.INPUT, 1: kind.OUTPUT}
+
+
+
+def members (path: str) -> List[str]:
+    """ Method to get the csv files of a zip archive in natural order (dataset_2 before dataset_10) """
+    with zipfile.ZipFile(path) as archive:
+        names = [name for name in archive.namelist() if name.lower().endswith(".csv")]
+    return sorted(names, key=lambda name: [int(i) if i.isdigit() else i for i in re.split(r"(\d+)", name)])
+
+
+@contextlib.contextmanager
+def _open (path: str, member: Optional[str] = None) -> Generator[TextIO, None, None]:
+    """ Open a csv file, or a csv file inside a zip archive, as a stream of text """
+    if not zipfile.is_zipfile(path):
+        with open(path, newline="") as file:
+            yield file
+        return
+
+    with zipfile.ZipFile(path) as archive:
+        if member is None:
+            names = members(path)
+            if len(names) != 1:
+                raise ValueError(f"The archive contains {len(names)} csv files, the member must be specified.")
+            member = names[0]
+        with archive.open(member) as file:
+            yield io.TextIOWrapper(file, newline="")
+
+
+
+def chunks (path: str, member: Optional[str] = None, *, chunksize: int = 65_536, 
+            avgArrival: Optional[float] = None) -> Generator[Dict[str, np.ndarray], None, None]:
+    """
+    Generator of the jobs of a dataset as a columnar table. The file is read 
+    and parsed in bulk `chunksize` rows at a time, so that the memory used 
+    does not depend on the size of the dataset.
+
+    :param path: The path of the csv file or of the zip archive.
+    :param member: The csv file to read inside the zip archive.
+    :param chunksize: The number of rows parsed at a time.
+    :param avgArrival: The interarrival between operations. When the dataset has no 
+                        ARRIVAL column the arrivals are generated as a Poisson process.
+    :return: For each chunk, a dictionary column name -> array.
+    """
+    with _open(path, member) as file:
+        header = [name.split()[0].upper() for name in next(csv.reader(file))]
+        if ARRIVAL not in header and avgArrival is None:
+            raise ValueError("The dataset has no ARRIVAL column and no avgArrival is provided.")
+
+        t = 0.0
+        while lines := list(itertools.islice(file, chunksize)):
+            data = np.loadtxt(lines, delimiter=",", ndmin=2)
+            table = {name: data[:, i] for i, name in enumerate(header)}
+            for name in (TYPE, BAY, QUALITY, QUANTITY, LENGTH):
+                column = table[name]
+                if not np.array_equal(column, np.floor(column)):
+                    raise ValueError(f"The column {name} contains non-integer values.")
+                table[name] = column.astype(np.int64)
+
+            if ARRIVAL not in table:
+                arrivals = t + np.cumsum(np.random.exponential(avgArrival, len(data)))
+                t = arrivals[-1]
+                table[ARRIVAL] = arrivals
+            yield table
+
+
+
+def load (path: str, member: Optional[str] = None, *, chunksize: int = 65_536,
+        avgArrival: Optional[float] = None, 
+        codes: Optional[Dict[int, Code]] = None, 
+        depots: Optional[Dict[str, Dict[int, int]]] = None) -> Generator[Job, None, None]:
+    """
+    Generator of the jobs of a dataset. Each input row brings a single 
+    bundle weighting QUANTITY, while each output row requires QUANTITY 
+    of the product. 
+
+    :param path: The path of the csv file or of the zip archive.
+    :param member: The csv file to read inside the zip archive.
+    :param chunksize: The number of rows parsed at a time.
+    :param avgArrival: The interarrival between operations (used when there is no ARRIVAL column).
+    :param codes: The product corresponding to each LENGTH. The products not given are 
+                identified by their length alone, i.e. Code(length, 0).
+    :param depots: For each kind of job the depot corresponding to each BAY (by default the BAY itself).
+    """
+    codes = dict(codes or {})
+    for table in chunks(path, member, chunksize=chunksize, avgArrival=avgArrival):
+        for arrival, _type, bay, quality, quantity, length in zip(table[ARRIVAL].tolist(), table[TYPE].tolist(), 
+                                                table[BAY].tolist(), table[QUALITY].tolist(), 
+                                                table[QUANTITY].tolist(), table[LENGTH].tolist()):
+            _kind = TYPES[_type]
+            depot = depots[_kind][bay] if depots is not None else bay
+            if (code := codes.get(length)) is None:
+                code = codes[length] = Code(length, 0)
+            yield Job(arrival, depot, _kind, code, length, quantity, quality, 1)
@@ -0,0 +1,82 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import heapq
+import itertools
+
+from typing import Dict, List, Optional, Tuple
+
+from asrs import kind
+from .source import Job, Code
+
+
+class Deferred (object):
+    """
+    An instance of this class keeps the jobs that could not be processed at 
+    their arrival. The inputs are indexed by quantity and length of the bundles, 
+    the outputs by product code. Each index entry is a heap sorted by arrival,
+    so that waking up the oldest job compatible with a location costs O(log n).
+    """
+    def __init__(self):
+        self.inputs: Dict[Tuple[int, int], List[Tuple[float, int, Job]]] = {}
+        self.outputs: Dict[Code, List[Tuple[float, int, Job]]] = {}
+        self.counter = itertools.count()
+        self.size = 0
+        # The overall number of times a job has been postponed
+        self.postponed = 0
+
+
+    def __len__(self):
+        return self.size
+
+
+    def park (self, job: Job) -> None:
+        """ Method to defer a job which cannot be processed now """
+        if job.kind == kind.INPUT:
+            heap = self.inputs.setdefault((job.quantity, job.length), [])
+        else:
+            heap = self.outputs.setdefault(job.code, [])
+        heapq.heappush(heap, (job.arrival, next(self.counter), job))
+        self.size += 1
+        self.postponed += 1
+
+
+    def _pop (self, index: Dict, key) -> Job:
+        heap = index[key]
+        _, _, job = heapq.heappop(heap)
+        if not heap:
+            del index[key]
+        self.size -= 1
+        return job
+
+
+    def wake_input (self, location) -> Optional[Job]:
+        """ Method to get (and remove) the oldest deferred input that fits into a location """
+        spans = {1: location.capacity(1), 2: location.capacity(2)}
+        best = min(((heap[0], key) for key, heap in self.inputs.items() if key[1] <= spans[key[0]]), default=None)
+        if best is None:
+            return None
+        return self._pop(self.inputs, best[1])
+
+
+    def wake_output (self, code: Code) -> Optional[Job]:
+        """ Method to get (and remove) the oldest deferred output requiring a product """
+        if code not in self.outputs:
+            return None
+        return self._pop(self.outputs, code)
@@ -0,0 +1,101 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import numpy as np
+
+from typing import Dict
+
+
+# Types of event
+START = 0       # The job starts to be executed
+END = 1         # The job is completed
+REQUEST = 2     # A machine is requested for the job
+GRANT = 3       # The request of a machine is granted
+RELEASE = 4     # A machine is released
+ARRIVED = 5     # A machine has reached the position where it is needed by the job
+STORED = 6      # The crane has stored the bundles into the location
+RETRIEVED = 7   # The crane has brought the bundles from the location to the lift
+
+NAMES = ("START", "END", "REQUEST", "GRANT", "RELEASE", "ARRIVED", "STORED", "RETRIEVED")
+
+# The value of machine for the events that do not involve any machine
+NONE = -1
+
+DTYPE = np.dtype([("job", np.int64), ("event", np.int8), ("machine", np.int16), ("time", np.float64)])
+
+
+
+class EventLog (object):
+    """
+    An instance of this class is a preallocated, array-backed log of the events 
+    of the jobs: each record is (job id, event type, machine id, time), and it is 
+    appended in O(1). Without a bound the log doubles when full, while as a ring 
+    buffer it keeps only the last `capacity` events.
+    """
+    def __init__(self, capacity: int = 1 << 16, ring: bool = False):
+        assert capacity > 0, "The capacity of the log must be positive."
+        self.data = np.zeros(capacity, dtype=DTYPE)
+        self.ring = ring
+        # The number of events ever added
+        self.count = 0
+
+
+    def __len__(self):
+        return min(self.count, len(self.data))
+
+
+    @property
+    def dropped (self) -> int:
+        """ The number of events overwritten in the ring buffer """
+        return self.count - len(self)
+
+
+    def add (self, job: int, event: int, machine: int, time: float) -> None:
+        data, i = self.data, self.count
+        if i >= len(data):
+            if self.ring:
+                i %= len(data)
+            else:
+                self.data = data = np.concatenate((data, np.zeros(len(data), dtype=DTYPE)))
+        data[i] = (job, event, machine, time)
+        self.count += 1
+
+
+    def records (self) -> np.ndarray:
+        """ The events in the log in chronological order """
+        n, data = len(self), self.data
+        if self.count <= len(data):
+            return data[:n].copy()
+        split = self.count % len(data)
+        return np.concatenate((data[split:], data[:split]))
+
+
+    def timeline (self, job: int) -> np.ndarray:
+        """ The events of a job in chronological order """
+        records = self.records()
+        return records[records["job"] == job]
+
+
+    def timelines (self) -> Dict[int, np.ndarray]:
+        """ The timelines of all the jobs in the log """
+        records = self.records()
+        order = np.argsort(records["job"], kind="stable")
+        records = records[order]
+        jobs, starts = np.unique(records["job"], return_index=True)
+        return dict(zip(jobs.tolist(), np.split(records, starts[1:])))
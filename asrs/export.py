@@ -0,0 +1,137 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import operator
+import numpy as np
+
+from typing import Dict, Tuple
+
+# Columns of the completed jobs and the respective types
+JOB_COLUMNS = (
+    ("arrival", np.float64), ("depot", np.int32), ("kind", "U6"), 
+    ("code_length", np.int32), ("code_weight", np.int32), ("quantity", np.int32),
+    ("weight", np.float64), ("quality", np.float64), ("start", np.float64), ("end", np.float64),
+    ("x", np.float64), ("y", np.float64), ("z", np.float64), ("rack", np.int32),
+)
+
+
+def jobs (sim) -> Dict[str, np.ndarray]:
+    """ The completed jobs of a simulation, one array for each column """
+    done = sim.done
+    n = len(done)
+    getters = {
+        "arrival" : operator.attrgetter("arrival"),
+        "depot" : operator.attrgetter("depot"),
+        "kind" : operator.attrgetter("kind"),
+        "code_length" : operator.attrgetter("code.length"),
+        "code_weight" : operator.attrgetter("code.weight"),
+        "quantity" : operator.attrgetter("quantity"),
+        "weight" : operator.attrgetter("weight"),
+        "quality" : operator.attrgetter("quality"),
+        "start" : operator.attrgetter("started"),
+        "end" : operator.attrgetter("ended"),
+        "x" : lambda job: job.destination[0],
+        "y" : lambda job: job.destination[1],
+        "z" : lambda job: job.destination[2],
+        "rack" : operator.attrgetter("rack"),
+    }
+    result = {}
+    for name, dtype in JOB_COLUMNS:
+        if dtype == "U6":
+            result[name] = np.array([getters[name](job) for job in done], dtype=dtype)
+        else:
+            result[name] = np.fromiter(map(getters[name], done), dtype=dtype, count=n)
+    return result
+
+
+
+def machines (sim) -> Dict[str, np.ndarray]:
+    """ 
+    The statistics of the machines of a simulation, one array for each column. The 
+    statistics on requests and utilisation need the metrics, otherwise they are NaN.
+    """
+    # The rows are in the same order of the machine ids of the event log
+    rows = [(f"shuttle-{i}", "shuttle", -1, shuttle) for i, shuttle in enumerate(sim.shuttles)]
+    for r, rack in enumerate(sim.racks):
+        rows.append((f"rack-{r}/crane", "crane", r, rack.crane))
+        rows.extend((f"rack-{r}/lift-{j}", "lift", r, lift) for j, lift in enumerate(rack.lifts))
+    if [r[3] for r in rows] != list(sim.machines):
+        raise ValueError("The machines of the simulation are not in the order of the machine ids.")
+
+    metrics, horizon = sim.metrics, sim.env.now
+    nan = float("nan")
+    result = {
+        "name" : np.array([r[0] for r in rows]),
+        "type" : np.array([r[1] for r in rows]),
+        "rack" : np.array([r[2] for r in rows], dtype=np.int32),
+        "moving_time" : np.array([sum(m.moving_time for m in (machine.mx, machine.my, machine.mz)) 
+                                  if hasattr(machine, "mx") else machine.moving_time for *_, machine in rows]),
+    }
+    if metrics is None:
+        for column in ("requests", "mean_wait", "max_wait", "busy", "utilisation"):
+            result[column] = np.full(len(rows), nan)
+        return result
+
+    waits = [metrics.waits[machine] for *_, machine in rows]
+    busy = np.array([metrics.busy[machine] for *_, machine in rows])
+    result["requests"] = np.array([w.count for w in waits], dtype=np.int64)
+    result["mean_wait"] = np.array([w.mean for w in waits])
+    result["max_wait"] = np.array([w.max for w in waits])
+    result["busy"] = busy
+    result["utilisation"] = busy / horizon if horizon > 0 else np.zeros(len(rows))
+    return result
+
+
+
+def save (sim, path: str) -> Tuple[str, ...]:
+    """
+    Save the completed jobs and the statistics of the machines of a simulation 
+    in a single bulk write. With a .parquet path two Parquet files are written 
+    (<name>.jobs.parquet and <name>.machines.parquet, pyarrow is required), 
+    otherwise a single .npz file with the columns "jobs/<column>" and "machines/<column>".
+
+    :return: The written files.
+    """
+    tables = {"jobs" : jobs(sim), "machines" : machines(sim)}
+
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("The export in Parquet requires pyarrow, use a .npz file instead.")
+        stem = path[:-len(".parquet")]
+        files = tuple(f"{stem}.{name}.parquet" for name in tables)
+        for file, columns in zip(files, tables.values()):
+            pyarrow.parquet.write_table(pyarrow.table(columns), file)
+        return files
+
+    np.savez(path, **{f"{name}/{column}" : values for name, columns in tables.items() for column, values in columns.items()})
+    return (path if path.endswith(".npz") else path + ".npz", )
+
+
+
+def load (path: str) -> Dict[str, Dict[str, np.ndarray]]:
+    """ Load the tables saved in a .npz file (e.g., pandas.DataFrame(load(path)["jobs"])) """
+    result = {"jobs" : {}, "machines" : {}}
+    with np.load(path) as data:
+        for key in data.files:
+            name, column = key.split("/", 1)
+            result[name][column] = data[key]
+    return result
@@ -0,0 +1,66 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import collections
+
+from typing import Dict, Iterable, Collection
+
+from .source import Bundle, Code
+
+
+class Inventory (object):
+    """ 
+    An instance of this class is an index of the bundles stored inside the 
+    warehouse, grouped by product code and by rack. The index is kept updated 
+    by the locations every time some bundles are placed or taken. The racks 
+    stored in arrays are not indexed, since their Occupancy answers directly.
+    """
+    def __init__(self, racks: Iterable = ()):
+        self.bundles: Dict[Code, Dict[object, Dict[Bundle, None]]] = collections.defaultdict(lambda: collections.defaultdict(dict))
+        for rack in racks:
+            self.bind(rack)
+
+
+    def bind (self, rack) -> None:
+        """ Method to index a rack and all the bundles already stored in it """
+        rack.inventory = self
+        if rack.occupancy is not None:
+            return
+        for loc in rack.locations:
+            for items in loc.items.values():
+                self.add(items)
+
+
+    def add (self, bundles: Iterable[Bundle]) -> None:
+        """ Method to index some bundles just placed into a location """
+        for bundle in bundles:
+            self.bundles[bundle.code][bundle.loc.rack][bundle] = None
+
+
+    def remove (self, bundles: Iterable[Bundle]) -> None:
+        """ Method to remove from the index some bundles just taken from a location """
+        for bundle in bundles:
+            del self.bundles[bundle.code][bundle.loc.rack][bundle]
+
+
+    def get (self, code: Code, rack) -> Collection[Bundle]:
+        """ Method to get the bundles of a certain product stored into a rack """
+        if rack.occupancy is not None:
+            return rack.occupancy.find(code, rack.index)
+        return self.bundles[code][rack].keys()
@@ -0,0 +1,152 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import simpy
+
+from typing import Optional, Tuple, Sequence, Union
+
+from .machine import Shuttle, Lift, Crane, Depot
+from .rack import Rack
+from .occupancy import Occupancy, OBJECTS, ARRAYS
+from .simulation import Simulation
+
+
+class Layout (object):
+    """ 
+    An instance of this class describes the geometry and the machines of a system, 
+    and it is used to build simulations of it. Racks are placed side by side 
+    every `rack_distance`, and each depot has its own shuttle and one lift per rack. 
+    Speed and acceleration of the shuttles can be given for each depot.
+
+    The content of the racks is kept by Location objects (storage=OBJECTS), or 
+    by the arrays of an Occupancy of the whole warehouse (storage=ARRAYS), which 
+    needs much less memory and fills the warehouse in bulk in warmup.
+    """
+    def __init__(self, *, nracks: int = 3, ncorridors: int = 30, nlevels: int = 10, 
+                corridor_size: int = 4, level_size: int = 1, rack_distance: int = 12,
+                nshelves: int = 6, shelves_deep: int = 2, shelves_size: int = 2,
+                ndepots: int = 4, depot_distance: int = 30,
+                shuttle_speed: Union[float, Sequence[float]] = 2.0, 
+                shuttle_acceleration: Union[float, Sequence[float]] = 0.5,
+                lift_speed: float = 0.6, lift_acceleration: float = 0.3,
+                crane_speeds: Tuple[float, float, float] = (1.3, 1.3, 1.3), 
+                crane_accelerations: Tuple[float, float, float] = (0.3, 0.3, 0.3),
+                uploadTime: float = 20.0, storage: str = OBJECTS):
+        if storage not in (OBJECTS, ARRAYS):
+            raise ValueError(f"Unknown storage {storage!r}, it must be {OBJECTS!r} or {ARRAYS!r}.")
+        self.nracks, self.ncorridors, self.nlevels = nracks, ncorridors, nlevels
+        self.corridor_size, self.level_size, self.rack_distance = corridor_size, level_size, rack_distance
+        self.nshelves, self.shelves_deep, self.shelves_size = nshelves, shelves_deep, shelves_size
+        self.ndepots, self.depot_distance = ndepots, depot_distance
+        self.shuttle_speed, self.shuttle_acceleration = shuttle_speed, shuttle_acceleration
+        self.lift_speed, self.lift_acceleration = lift_speed, lift_acceleration
+        self.crane_speeds, self.crane_accelerations = tuple(crane_speeds), tuple(crane_accelerations)
+        self.uploadTime = uploadTime
+        self.storage = storage
+
+
+    def __repr__(self):
+        return f"Layout({', '.join(f'{k}={v}' for k, v in vars(self).items())})"
+
+
+    def shuttles (self, env) -> Tuple[Shuttle, ...]:
+        n = self.ndepots
+        speeds = tuple(self.shuttle_speed) if isinstance(self.shuttle_speed, (list, tuple)) else (self.shuttle_speed,) * n
+        accelerations = tuple(self.shuttle_acceleration) if isinstance(self.shuttle_acceleration, (list, tuple)) else (self.shuttle_acceleration,) * n
+        return tuple(Shuttle(env, speeds[i], accelerations[i], (i*self.depot_distance, 0, 0)) for i in range(n))
+
+
+    def depots (self) -> Tuple[Depot, ...]:
+        return tuple(Depot((i*self.depot_distance, 0, 0)) for i in range(self.ndepots))
+
+
+    def crane (self, env, i: int) -> Crane:
+        """ The crane of the i-th rack """
+        z, top = i * self.rack_distance, self.nlevels * self.level_size
+        return Crane(env, self.crane_speeds, self.crane_accelerations, (0, top, z))
+
+
+    def lifts (self, env, i: int) -> Tuple[Lift, ...]:
+        """ The lifts of the i-th rack (one for each depot) """
+        z, top, d = i * self.rack_distance, self.nlevels * self.level_size, self.depot_distance
+        return tuple(Lift(env, self.lift_speed, self.lift_acceleration, (j*d, 0, z), (j*d, top, z), (j*d, 0, z)) 
+                    for j in range(self.ndepots))
+
+
+    def racks (self, env) -> Tuple[Rack, ...]:
+        occupancy = None
+        if self.storage == ARRAYS:
+            occupancy = Occupancy(self.nracks, 2 * self.ncorridors * self.nlevels, self.shelves_deep, self.nshelves)
+        return tuple(Rack(ncorridors=self.ncorridors, nlevels=self.nlevels, 
+                        corridor_size=self.corridor_size, level_size=self.level_size,
+                        position=(0, 0, i*self.rack_distance), 
+                        nshelves=self.nshelves, shelves_deep=self.shelves_deep, shelves_size=self.shelves_size, 
+                        crane=self.crane(env, i), lifts=self.lifts(env, i), occupancy=occupancy, index=i)
+                    for i in range(self.nracks))
+
+
+    def build (self, env, config, racks: Optional[Tuple[Rack, ...]] = None, **kwargs) -> Simulation:
+        """ 
+        Method to build a simulation of the system. 
+
+        :param racks: Racks already built to be used instead of new ones (their machines 
+                    are replaced by new ones bound to the environment).
+        :param kwargs: Other parameters of the simulation.
+        """
+        if racks is None:
+            racks = self.racks(env)
+        else:
+            for i, rack in enumerate(racks):
+                rack.crane = self.crane(env, i)
+                rack.lifts = self.lifts(env, i)
+        return Simulation(env, config, shuttles=self.shuttles(env), racks=racks, depots=self.depots(), 
+                        uploadTime=self.uploadTime, **kwargs)
+
+
+
+class Template (object):
+    """
+    An instance of this class is a warehouse warmed up only once, whose state 
+    is restored into each new simulation built from it. The racks are built the 
+    first time they are needed in a process and then reused, so only one 
+    simulation built from a template can be executed at a time.
+
+    Only the layout and the compact snapshot of the stored bundles are 
+    pickled, so a template can be shared with other processes.
+    """
+    def __init__(self, layout: Layout, code_prob, depot_prob, quantity_prob, quality_prob, initFilling: float):
+        self.layout = layout
+        sim = layout.build(simpy.Environment(), None)
+        sim.warmup(code_prob=code_prob, depot_prob=depot_prob, quantity_prob=quantity_prob, 
+                   quality_prob=quality_prob, percentage=initFilling)
+        self.snapshot = tuple(rack.snapshot() for rack in sim.racks)
+        self._racks = sim.racks
+
+
+    def __getstate__(self):
+        return {"layout" : self.layout, "snapshot" : self.snapshot, "_racks" : None}
+
+
+    def clone (self, env, config, **kwargs) -> Simulation:
+        """ Method to build a new simulation starting from the state of the template """
+        if self._racks is None:
+            self._racks = self.layout.racks(env)
+        for rack, snapshot in zip(self._racks, self.snapshot):
+            rack.restore(snapshot)
+        return self.layout.build(env, config, racks=self._racks, **kwargs)
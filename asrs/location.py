@@ -17,27 +17,131 @@ Author's website: https://mattianeroni.github.io
 
 %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 """
-import numpy as np 
 import collections
-import operator 
+import bisect
 
-from typing import Tuple, Dict, List, Sequence 
+from typing import Tuple, Dict, List, Optional, Iterator
 
 from .source import Job, Bundle, Code
 
 
-class Space (object):
-    """ An instance of this class represents a space in a storage location """
-    def __init__(self, start, length):
-        self.start = start 
+class FreeSpace (object):
+    """ 
+    An instance of this class represents the free space along one depth 
+    of a storage location. The free space is kept as a sorted collection of 
+    disjoint intervals [start, end), where adjacent intervals are always merged.
+    """
+    __slots__ = ("length", "starts", "ends")
+
+    def __init__(self, length: int):
         self.length = length
+        self.starts: List[int] = [0]
+        self.ends: List[int] = [length]
+
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        """ Iterate the free intervals as couples (start, length) """
+        return ((s, e - s) for s, e in zip(self.starts, self.ends))
 
-    @property 
-    def end (self):
-        return self.start + self.length - 1
 
     def __repr__(self):
-        return f"Space(start={self.start}, length={self.length})"
+        return f"FreeSpace({list(self)})"
+
+
+    @property 
+    def free (self) -> int:
+        """ The overall free length """
+        return sum(self.ends) - sum(self.starts)
+
+
+    def find (self, length: int, lo: int = 0, hi: Optional[int] = None) -> Optional[int]:
+        """ 
+        Method to get the starting position of the first free span of 
+        at least `length` shelves inside [lo, hi). 
+        """
+        starts, ends = self.starts, self.ends
+        hi = self.length if hi is None else hi
+        i = bisect.bisect_right(ends, lo)
+        while i < len(starts) and starts[i] < hi:
+            start, end = max(starts[i], lo), min(ends[i], hi)
+            if end - start >= length:
+                return start
+            i += 1
+        return None
+
+
+    def common (self, other: "FreeSpace", length: int) -> Optional[int]:
+        """ 
+        Method to get the starting position of the first span of at least 
+        `length` shelves which is free both in this depth and in the other one.
+        """
+        for start, end in zip(self.starts, self.ends):
+            if end - start >= length and (position := other.find(length, start, end)) is not None:
+                return position
+        return None
+
+
+    def largest (self) -> int:
+        """ Method to get the length of the largest free span """
+        return max((e - s for s, e in zip(self.starts, self.ends)), default=0)
+
+
+    def largest_common (self, other: "FreeSpace") -> int:
+        """ Method to get the length of the largest span free both in this depth and in the other one """
+        a_starts, a_ends, b_starts, b_ends = self.starts, self.ends, other.starts, other.ends
+        i, j, best = 0, 0, 0
+        while i < len(a_starts) and j < len(b_starts):
+            best = max(best, min(a_ends[i], b_ends[j]) - max(a_starts[i], b_starts[j]))
+            if a_ends[i] < b_ends[j]:
+                i += 1
+            else:
+                j += 1
+        return best
+
+
+    def allocate (self, start: int, length: int) -> None:
+        """ Method to occupy the span [start, start + length) """
+        starts, ends = self.starts, self.ends
+        end = start + length
+        i = bisect.bisect_right(starts, start) - 1
+        s, e = starts[i], ends[i]
+        assert s <= start and end <= e, "Allocation of a span that is not free."
+
+        if s == start and e == end:
+            # the space has exactly the same size of the bundle
+            del starts[i], ends[i]
+        elif s == start:
+            # the space starts where the bundle is placed
+            starts[i] = end
+        elif e == end:
+            # the space ends where the bundle ends
+            ends[i] = start
+        else:
+            # the space is bigger than the bundle and it is split
+            ends[i] = start
+            starts.insert(i + 1, end)
+            ends.insert(i + 1, e)
+
+
+    def release (self, start: int, length: int) -> None:
+        """ Method to free the span [start, start + length) merging it with the neighbours """
+        starts, ends = self.starts, self.ends
+        end = start + length
+        i = bisect.bisect_left(starts, start)
+        before = i > 0 and ends[i - 1] == start
+        after = i < len(starts) and starts[i] == end
+
+        if before and after:
+            ends[i - 1] = ends[i]
+            del starts[i], ends[i]
+        elif before:
+            ends[i - 1] = end
+        elif after:
+            starts[i] = start
+        else:
+            starts.insert(i, start)
+            ends.insert(i, end)
+
 
 
 class Location (object):
@@ -45,16 +149,37 @@ class Location (object):
     An instance of this class represents a storage 
     location inside the warehouse. 
     """
+    __slots__ = ("rack", "position", "length", "deep", "shelves_size", "codes", "items", "spaces", "_frozen")
+
     def __init__(self, rack, position: Tuple[int,int,int], length: int, deep: int, shelves_size: int):
         self.rack = rack
-        self.position = np.asarray(position)
+        self.position = tuple(position)
         self.length, self.deep = length, deep
         self.shelves_size = shelves_size
-        #self.space = np.zeros(spaces)
-        self.codes: Dict[Code, int] = collections.defaultdict(lambda: 0)
-        #self.bundles: Dict[int, List[Bundle]] = collections.defaultdict(list)
-        self.items: Dict[int, List[Space]] = { i: [Space(0, length)] for i in range(deep) }
-        self.frozen = False
+        self.codes: Dict[Code, int] = collections.defaultdict(int)
+        self.items: Dict[int, List[Bundle]] = { i: [] for i in range(deep) }
+        self.spaces: Tuple[FreeSpace, ...] = tuple(FreeSpace(length) for _ in range(deep))
+        self._frozen = False
+
+
+    @property 
+    def frozen (self) -> bool:
+        """ A frozen location is interested by a job and cannot be used by others """
+        return self._frozen
+
+    @frozen.setter
+    def frozen (self, value: bool) -> None:
+        self._frozen = value
+        self.rack.capacity.update(self)
+
+
+    def capacity (self, quantity: int) -> int:
+        """ Method to get the length of the longest bundles that can be placed in a given quantity """
+        if quantity == 1:
+            return self.spaces[0].largest()
+        if quantity == 2 and self.deep == 2:
+            return self.spaces[0].largest_common(self.spaces[1])
+        return 0
 
 
     def keepCode (self, code: Code) -> bool:
@@ -62,242 +187,86 @@ class Location (object):
         return self.codes[code] > 0 
 
 
+    def reset (self) -> None:
+        """ Method to empty the location """
+        self.codes.clear()
+        self.items = { i: [] for i in range(self.deep) }
+        self.spaces = tuple(FreeSpace(self.length) for _ in range(self.deep))
+        self._frozen = False
+
+
+    def store (self, bundle: Bundle, deep: int, start: int, length: int) -> None:
+        """ Method to store a bundle at a given depth and starting position """
+        bundle.start = start 
+        bundle.deep = deep 
+        bundle.loc = self 
+        self.items[deep].append(bundle)
+        self.spaces[deep].allocate(start, length)
+
+
     def place (self, job: Job) -> bool:
         """ Method used to place the bundles moved by the Job into the Location """
         n, length, code = job.quantity, job.length, job.code 
-        items = self.items
+        spaces = self.spaces
 
         # The job brings two bundles...
         if n == 2 and self.deep == 2:
-            # if there's no space in at least one of the sheves
-            # the placement is not possible
-            if sum(1 for i in items[0] if type(i) == Space) == 0 or sum(1 for i in items[1] if type(i) == Space) == 0:
+            # look for a space free in both the depths
+            _start = spaces[0].common(spaces[1], length)
+            if _start is None:
                 return False
-
-            # try the couples of space in first and second depth...
-            for s1 in items[0]:
-                
-                # if s1 is a bundle and not a space...
-                if type(s1) != Space or s1.length < length:
-                    continue 
-
-                for s2 in items[1]:
-
-                    # if s2 is a bundle and not a space...
-                    if type(s2) != Space or s2.length < length:
-                        continue 
-
-                    # if spaces do not overlap...
-                    if s2.start > s1.end or s1.start > s2.end:
-                        continue
-
-                    # compute the space length
-                    _start = max(s1.start, s2.start) 
-                    _end = min(s1.end, s2.end)
-                    _space = _end - _start + 1
-
-                    # if the space is enough to place the bundles...
-                    if _space >= length:
-                        # place job bundles 
-                        job.bundles[0].start = _start 
-                        job.bundles[1].start = _start 
-                        job.bundles[0].deep = 0 
-                        job.bundles[1].deep = 1 
-                        job.bundles[0].loc = self 
-                        job.bundles[1].loc = self
-                        items[0].append(job.bundles[0])
-                        items[1].append(job.bundles[1])
-                        
-                        # update spaces
-                        for i, space in enumerate((s1, s2)):
-
-                            bundle = job.bundles[i]
-                            
-                            if space.start == _start and space.length == length:
-                                # the space has exactly the same size of bundles 
-                                items[i].remove(space) 
-                            
-                            elif space.start == _start:
-                                # the space starts where the bundle is placed and 
-                                # it therefore must be shortened
-                                space.start = _start + length
-                                space.length -= length
-                                if space.length == 0: 
-                                    items[i].remove(space)
-
-                            elif space.end == _end:
-                                # the space ends where the bundle ends 
-                                space.length -= length 
-                                if space.length == 0:
-                                    items[i].remove(space)
-                            
-                            else: 
-                                # the space is bigger than the bundle
-                                space_end = space.end
-                                space.length = _start - space.start
-                                if space.length == 0:
-                                    items[i].remove(space)
-                                newspace = Space(_start + length, space_end - _end)
-                                if newspace.length >= 1:
-                                    items[i].append(newspace)
-
-                        # sort items by starting position 
-                        items[0].sort(key=operator.attrgetter("start"))
-                        items[1].sort(key=operator.attrgetter("start"))
-
-                        # update codes dict and job destination 
-                        self.codes[code] += 2
-                        job.destination = self.position + np.asarray([0, 0, (length/2 + _start) * self.shelves_size])
-                        
-                        # return that the bundles have been placed
-                        return True
+            self.store(job.bundles[0], 0, _start, length)
+            self.store(job.bundles[1], 1, _start, length)
 
         elif n == 1 and self.deep == 1:
-            space = next( (space for space in items[0] if type(space) == Space and space.length >= length), None)
-            if space is not None:
-                # place bundle
-                _start = space.start 
-                job.bundles[0].start = _start
-                job.bundles[0].deep = 0
-                job.bundles[0].loc = self 
-                items[0].append(job.bundles[0])
-
-                # update space 
-                space.start = _start + length 
-                space.length -= length 
-                if space.length == 0:
-                    items[0].remove(space)
-
-                # sort items by starting position 
-                items[0].sort(key=operator.attrgetter("start"))
-
-                # update codes dict and job destination 
-                self.codes[code] += 1
-                job.destination = self.position + np.asarray([0, 0, (length/2 + _start) * self.shelves_size])
-                return True
-                
+            _start = spaces[0].find(length)
+            if _start is None:
+                return False
+            self.store(job.bundles[0], 0, _start, length)
 
         elif n == 1 and self.deep == 2:
             # if there's no space in first depth the bundle cannot be placed
-            if sum(1 for i in items[0] if type(i) == Space) == 0:
+            s1 = spaces[0].find(length)
+            if s1 is None:
                 return False
-
-            # try the couples of space in first and second depth...
-            for s1 in items[0]:
-                
-                # if s1 is a bundle and not a space...
-                if type(s1) != Space or s1.length < length:
-                    continue 
-
-                # Placement is possible. But let's check before the second depth.
-                for s2 in items[1]:
-
-                    # if s2 is a bundle and not a space...
-                    if type(s2) != Space or s2.length < length:
-                        continue 
-
-                    # if spaces do not overlap...
-                    if s2.start > s1.end or s1.start > s2.end:
-                        continue
-
-                    # compute the space length
-                    _start = max(s1.start, s2.start) 
-                    _end = min(s1.end, s2.end)
-                    _space = _end - _start + 1
-
-                    # if the space is enough to place the bundles...
-                    if _space >= length:
-                        # Placement in second depth...
-                        # place job bundle
-                        job.bundles[0].start = _start 
-                        job.bundles[0].deep = 1
-                        job.bundles[0].loc = self 
-                        items[1].append(job.bundles[0])
-                        
-                        # update space
-                        if s2.start == _start and s2.length == length:
-                            items[1].remove(s2) 
-                            
-                        elif s2.start == _start:
-                            s2.start = _start + length
-                            s2.length -= length
-                            if s2.length == 0: 
-                                items[1].remove(s2)
-
-                        elif s2.end == _end:
-                            s2.length -= length 
-                            if s2.length == 0:
-                                items[1].remove(s2)
-                            
-                        else: 
-                            # the space is bigger than the bundle
-                            s2 = space.end
-                            s2.length = _start - s2.start
-                            if s2.length == 0:
-                                items[1].remove(s2)
-                            newspace = Space(_start + length, space_end - _end)
-                            if newspace.length >= 1:
-                                items[1].append(newspace)
-
-                        # sort items by starting position 
-                        items[1].sort(key=operator.attrgetter("start"))
-
-                        # update codes dict and job destination 
-                        self.codes[code] += 1
-                        job.destination = self.position + np.asarray([0, 0, (length/2 + _start) * self.shelves_size])
-                        
-                        # return that the bundles have been placed
-                        return True
-                
+            
+            # Placement in second depth if there is a free space 
+            # behind the first space of the first depth...
+            i = bisect.bisect_right(spaces[0].starts, s1) - 1
+            _start = spaces[1].find(length, s1, spaces[0].ends[i])
+            if _start is not None:
+                self.store(job.bundles[0], 1, _start, length)
+            else:
                 # Bundle placed in first depth...
-                # update bundle
-                _start = s1.start 
-                job.bundles[0].start = _start
-                job.bundles[0].deep = 0
-                job.bundles[0].loc = self 
-                items[0].append(job.bundles[0])
-                # update space
-                s1.start += length 
-                s1.length -= length 
-                if s1.length <= 1:
-                    items[0].remove(s1)
-                
-                items[0].sort(key=operator.attrgetter("start"))
-                self.codes[code] += 1
-                job.destination = self.position + np.asarray([0, 0, (length/2 + _start) * self.shelves_size])
-                return True
-
-        return False 
+                _start = s1 
+                self.store(job.bundles[0], 0, _start, length)
+
+        else:
+            return False 
+
+        # update codes dict, inventory and job destination 
+        self.codes[code] += n
+        if (inventory := self.rack.inventory) is not None:
+            inventory.add(job.bundles)
+        self.rack.capacity.update(self)
+        x, y, z = self.position
+        job.destination = (x, y, z + (length/2 + _start) * self.shelves_size)
+        return True
 
 
 
     def take (self, job: Job) -> None:
         """ Method used to take the bundles required by the Job from the Location """
         n, code, length = job.quantity, job.code, job.length 
-        items = self.items 
 
         for bundle in job.bundles:
-            location = items[bundle.deep] 
-            idx = location.index(bundle)
-
-            before = location[idx - 1] if idx > 0 else None 
-            after = location[idx + 1] if idx < len(location) - 1 else None 
-
-            if type(before) == Space:
-                if type(after) == Space:
-                    before.length += length + after.length
-                    location.remove(after)
-                else:
-                    before.length += length 
-
-            elif type(after) == Space:
-                after.start = bundle.start
-                after.length += length
-                
-            items[bundle.deep].remove(bundle)
+            self.items[bundle.deep].remove(bundle)
+            self.spaces[bundle.deep].release(bundle.start, length)
         
-        items[0].sort(key=operator.attrgetter("start"))
-        items[1].sort(key=operator.attrgetter("start"))
-        self.codes[job.code] -= n
-        job.destination = self.position + np.asarray([0, 0, (length/2 + job.bundles[0].start) * self.shelves_size])
-        return True
\ No newline at end of file
+        self.codes[code] -= n
+        if (inventory := self.rack.inventory) is not None:
+            inventory.remove(job.bundles)
+        self.rack.capacity.update(self)
+        x, y, z = self.position
+        job.destination = (x, y, z + (length/2 + job.bundles[0].start) * self.shelves_size)
+        return True
@@ -19,28 +19,46 @@ Author's website: https://mattianeroni.github.io
 %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 """
 import simpy
-import numpy as np
 import collections
 import math
 
+from typing import Dict, Tuple
+
 
 
 class Depot (object):
 
+    __slots__ = ("position", "controlInterval", "queue", "queue_report", "area", "last")
+
     def __init__ (self, position, controlInterval = 1000):
-        self.position = np.asarray(position)
+        self.position = tuple(position)
         self.controlInterval = controlInterval
         self.queue = collections.deque()
         self.queue_report = dict()
+        # Integral of the queue length over time, up to the last change of the queue
+        self.area = 0.0
+        self.last = 0.0
+
+    def _accumulate (self, time):
+        self.area += len(self.queue) * (time - self.last)
+        self.last = time
 
     def push (self, job, time):
+        self._accumulate(time)
         self.queue.append(job)
         self.queue_report[time // self.controlInterval] = len(self.queue)
 
     def pop (self, time):
+        self._accumulate(time)
         self.queue.popleft()
         self.queue_report[time // self.controlInterval] = len(self.queue)
 
+    def mean_queue (self, time):
+        """ The time-average length of the queue from the beginning up to the given time """
+        if time <= 0:
+            return 0.0
+        return (self.area + len(self.queue) * (time - self.last)) / time
+
 
 
 class Machine (simpy.PriorityResource):
@@ -50,19 +68,43 @@ class Machine (simpy.PriorityResource):
         self.speed = speed
         self.acceleration = acceleration
         self.transitory_dist = 2 * speed**2 / (2*acceleration)
-        self.position = np.asarray(position)
-        self.direction = np.asarray(direction)
+        self.position = tuple(position)
+        self.direction = tuple(direction)
+        self.axis = self.direction.index(1)
         self.moving_time = 0.0
+        # The travel times between couples of coordinates along the axis of movement
+        self.times : Dict[Tuple[float, float], float] = {}
 
         super(Machine, self).__init__(env, capacity=1)
 
 
-    def move (self, position):
-        if (d := (np.abs(self.position - position) * self.direction).sum()) > 0:
-            a, v = self.acceleration, self.speed
-            time = math.sqrt(d * a) / a if d <= self.transitory_dist else (d - self.transitory_dist) / v + 2 * v / a
+    def travel_time (self, distance):
+        """ The time needed to cover a distance with a trapezoidal speed profile """
+        a, v = self.acceleration, self.speed
+        return math.sqrt(distance * a) / a if distance <= self.transitory_dist else (distance - self.transitory_dist) / v + 2 * v / a
+
+
+    def tabulate (self, coordinates):
+        """ Method to precompute the travel times between all the given coordinates """
+        coordinates = set(coordinates)
+        for i in coordinates:
+            for j in coordinates:
+                self.times[i, j] = self.travel_time(abs(i - j))
+
+
+    def travel (self, position):
+        """ Method to move the machine to a position, returning the time needed """
+        origin, destination = self.position[self.axis], position[self.axis]
+        if (time := self.times.get((origin, destination))) is None:
+            time = self.times[origin, destination] = self.travel_time(abs(origin - destination))
+        if time > 0:
             self.moving_time += time
             self.position = position
+        return time
+
+
+    def move (self, position):
+        if (time := self.travel(position)) > 0:
             yield self.env.timeout(time)
 
 
@@ -76,8 +118,8 @@ class Lift (Machine):
 
     def __init__ (self, env, speed, acceleration, position, up, down):
         self.env = env
-        self.up = np.asarray(up)
-        self.down = np.asarray(down)
+        self.up = tuple(up)
+        self.down = tuple(down)
         super(Lift, self).__init__(env, speed, acceleration, position, (0,1,0))
 
 
@@ -114,6 +156,28 @@ class Crane (simpy.PriorityResource):
         yield self.env.process(self.mx.move(position)) & self.env.process(self.mz.move(position))
 
 
+    def takeInDelays (self, job, uploadTime):
+        """ The durations of the consecutive phases of takeIn """
+        position = job.destination
+        return (max(self.mx.travel(position), self.mz.travel(position)), self.my.travel(position), uploadTime)
+
+
+    def prepareInDelays (self, position):
+        """ The durations of the consecutive phases of prepareIn (once the request is granted) """
+        return (self.my.travel(position), max(self.mx.travel(position), self.mz.travel(position)))
+
+
+    def takeOutDelays (self, position, job, uploadTime):
+        """ The durations of the consecutive phases of takeOut """
+        pLoc = job.destination
+        return (self.my.travel(position), 
+                max(self.mx.travel(pLoc), self.mz.travel(pLoc)), 
+                self.my.travel(pLoc), 
+                uploadTime, 
+                self.my.travel(position), 
+                max(self.mx.travel(position), self.mz.travel(position)))
+
+
     def takeOut (self, position, job, uploadTime):
         env = self.env
         pLoc = job.destination 
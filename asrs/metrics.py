@@ -0,0 +1,158 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import math
+import time
+import functools
+import collections
+import numpy as np
+
+from typing import Dict
+
+
+# The levels of detail of the metrics
+OFF = "off"
+SUMMARY = "summary"
+FULL = "full"
+
+
+
+class Statistic (object):
+    """ Running count, mean, variance and maximum of a quantity (Welford's algorithm) """
+    __slots__ = ("count", "mean", "m2", "max", "values")
+
+    def __init__(self, keep: bool = False):
+        self.count, self.mean, self.m2, self.max = 0, 0.0, 0.0, 0.0
+        self.values = [] if keep else None
+
+    def add (self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.max = max(self.max, value)
+        if self.values is not None:
+            self.values.append(value)
+
+    def report (self) -> Dict:
+        result = {"count" : self.count, "mean" : self.mean, "max" : self.max,
+                  "std" : math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0}
+        if self.values:
+            p = np.percentile(self.values, (5, 25, 50, 75, 95))
+            result["percentiles"] = dict(zip((5, 25, 50, 75, 95), p.tolist()))
+        return result
+
+
+
+class Metrics (object):
+    """
+    An instance of this class collects the metrics of a simulation:
+    the utilisation of shuttles, lifts and cranes, the waiting time of the 
+    requests made to them, the cycle time of the jobs, the number of 
+    postponed jobs, and (only at the FULL level) the simpy events per second.
+
+    At the SUMMARY level only running statistics are kept, while at the FULL 
+    level all the single values are kept as well, to study their distribution.
+    """
+    def __init__(self, sim, level: str = SUMMARY):
+        assert level in (SUMMARY, FULL), f"Unknown level of metrics {level}."
+        self.sim = sim
+        self.level = level
+        keep = level == FULL
+
+        # The names of the machines in the report
+        self.names = {}
+        for i, shuttle in enumerate(sim.shuttles):
+            self.names[shuttle] = f"shuttle-{i}"
+        for r, rack in enumerate(sim.racks):
+            self.names[rack.crane] = f"rack-{r}/crane"
+            for j, lift in enumerate(rack.lifts):
+                self.names[lift] = f"rack-{r}/lift-{j}"
+
+        self.waits: Dict[object, Statistic] = collections.defaultdict(functools.partial(Statistic, keep))
+        self.busy: Dict[object, float] = collections.defaultdict(float)
+        self.granted: Dict[object, float] = {}
+        self.cycle_times: Dict[str, Statistic] = collections.defaultdict(functools.partial(Statistic, keep))
+
+        self.events = 0
+        self.wall = [None, None]
+        if level == FULL:
+            self._count_events(sim.env)
+
+
+    def _count_events (self, env) -> None:
+        """ Wrap the step of the environment to count the processed events """
+        step, wall = env.step, self.wall
+        def counting_step ():
+            if wall[0] is None:
+                wall[0] = time.perf_counter()
+            self.events += 1
+            step()
+            wall[1] = time.perf_counter()
+        env.step = counting_step
+
+
+    def request (self, machine, req) -> None:
+        """ Method called when a request is made to a machine """
+        req.callbacks.append(functools.partial(self._granted, machine, self.sim.env.now))
+
+
+    def _granted (self, machine, requested: float, req) -> None:
+        now = self.sim.env.now
+        self.waits[machine].add(now - requested)
+        self.granted[req] = now
+
+
+    def release (self, machine, req) -> None:
+        """ Method called when a machine is released """
+        self.busy[machine] += self.sim.env.now - self.granted.pop(req)
+
+
+    def completed (self, job, time: float) -> None:
+        """ Method called when a job is completed """
+        self.cycle_times[job.kind].add(time - job.started)
+
+
+    def report (self) -> Dict:
+        """ Method to get a report of the collected metrics """
+        sim = self.sim
+        horizon = sim.env.now
+        machines = {}
+        for machine, name in self.names.items():
+            moving_time = sum(m.moving_time for m in (machine.mx, machine.my, machine.mz)) if hasattr(machine, "mx") else machine.moving_time
+            machines[name] = {
+                "requests" : self.waits[machine].report(),
+                "busy" : self.busy[machine],
+                "utilisation" : self.busy[machine] / horizon if horizon > 0 else 0.0,
+                "moving_time" : moving_time,
+            }
+
+        result = {
+            "level" : self.level,
+            "horizon" : horizon,
+            "machines" : machines,
+            "cycle_times" : {k : s.report() for k, s in self.cycle_times.items()},
+            "postponed" : sim.deferred.postponed,
+            "deferred" : len(sim.deferred),
+        }
+        if self.level == FULL:
+            elapsed = (self.wall[1] - self.wall[0]) if self.wall[0] is not None else 0.0
+            result["events"] = self.events
+            result["events_per_sec"] = self.events / elapsed if elapsed > 0 else None
+        return result
@@ -0,0 +1,550 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import numpy as np
+
+from typing import Dict, List, Optional, Tuple
+
+from .kind import INPUT
+from .source import Bundle, Code, Job
+
+
+# The storage backends of the racks: a graph of Location objects or the arrays of an Occupancy
+OBJECTS = "objects"
+ARRAYS = "arrays"
+
+# The value used for the shelves where nothing is stored
+FREE = -1
+
+_ONE = np.uint64(1)
+
+
+
+def _lowest (x: int) -> int:
+    """ The position of the lowest set bit """
+    return (x & -x).bit_length() - 1
+
+
+def _runs (free: int, length: int) -> int:
+    """ The bitmask of the shelves where a run of at least `length` free shelves starts """
+    runs = free
+    for k in range(1, length):
+        runs &= free >> k
+    return runs
+
+
+def _largest (free: int) -> int:
+    """ The length of the longest run of free shelves """
+    n = 0
+    while free:
+        free &= free >> 1
+        n += 1
+    return n
+
+
+def _vlowest (x: np.ndarray) -> np.ndarray:
+    """ The position of the lowest set bit of each element (-1 where no bit is set) """
+    low = x & (~x + _ONE)
+    with np.errstate(divide="ignore"):
+        position = np.log2(low.astype(np.float64))
+    return np.where(x != 0, position, -1).astype(np.int64)
+
+
+def _vruns (free: np.ndarray, length: int) -> np.ndarray:
+    runs = free.copy()
+    for k in range(1, length):
+        runs &= free >> np.uint64(k)
+    return runs
+
+
+def _vbelow (n: np.ndarray) -> np.ndarray:
+    """ The bitmasks of the shelves below n """
+    return (_ONE << n.astype(np.uint64)) - _ONE
+
+
+
+class _View (Bundle):
+    """ 
+    A bundle materialized from the arrays of an Occupancy. The views of the same 
+    stored bundle are equal, so they can be used in place of each other.
+    """
+    __slots__ = ("id",)
+
+    def __init__(self, k: int, code: Code, weight: float, quality: float, start: int, deep: int, loc):
+        self.id = k
+        self.code, self.weight, self.quality = code, weight, quality
+        self.start, self.deep, self.loc = start, deep, loc
+        self.taken = False
+
+    def __eq__(self, other):
+        return isinstance(other, _View) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+
+class Occupancy (object):
+    """
+    An instance of this class is the array-based storage of a whole warehouse, 
+    used by the racks built with storage=ARRAYS. The shelves are indexed by 
+    rack x location x depth x shelf, and each one keeps the id of the product 
+    code and the id of the bundle stored there. Each depth of each location 
+    also keeps the bitmask of its occupied shelves, so that the free runs are 
+    found with a few operations on integers.
+
+    The bundles are kept as columns (code, weight, quality, location, depth, 
+    start) indexed by their id, which grows with the order of storage. The Bundle 
+    objects needed by the jobs are materialized from the columns only when they 
+    are asked for, and they are not kept by the occupancy.
+    """
+    def __init__(self, nracks: int, nlocations: int, deep: int, length: int):
+        assert length < 64, "The bitmasks of the locations allow at most 63 shelves."
+        self.shape = (nracks, nlocations, deep, length)
+        self.code = np.full(self.shape, FREE, dtype=np.int32)
+        self.bundle = np.full(self.shape, FREE, dtype=np.int32)
+        # The same arrays indexed by the overall index of the location
+        self._code = self.code.reshape(-1, deep, length)
+        self._bundle = self.bundle.reshape(-1, deep, length)
+        self.masks = np.zeros((nracks * nlocations, deep), dtype=np.uint64)
+        self.locations: List[object] = [None] * (nracks * nlocations)
+
+        # The columns of the bundles (a free code marks the bundles already taken)
+        self.size = 0
+        self.b_code = np.empty(0, dtype=np.int32)
+        self.b_weight = np.empty(0, dtype=np.float64)
+        self.b_quality = np.empty(0, dtype=np.float64)
+        self.b_loc = np.empty(0, dtype=np.int32)
+        self.b_deep = np.empty(0, dtype=np.int8)
+        self.b_start = np.empty(0, dtype=np.int16)
+
+        self.codes: Dict[Code, int] = {}
+        self.products: List[Code] = []
+
+
+    def code_id (self, code: Code) -> int:
+        """ Method to get the id of a product code """
+        if (idx := self.codes.get(code)) is None:
+            idx = self.codes[code] = len(self.products)
+            self.products.append(code)
+        return idx
+
+
+    def _reserve (self, n: int) -> np.ndarray:
+        """ Method to get the ids of n new bundles, growing the columns if needed """
+        size = self.size + n
+        if size > len(self.b_code):
+            capacity = max(size, 2 * len(self.b_code), 1024)
+            for name in ("b_code", "b_weight", "b_quality", "b_loc", "b_deep", "b_start"):
+                column = getattr(self, name)
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+        ids = np.arange(self.size, size, dtype=np.int32)
+        self.size = size
+        return ids
+
+
+    def _compact (self) -> None:
+        """ Method to drop the columns of the bundles already taken, renumbering the others """
+        alive = np.flatnonzero(self.b_code[:self.size] != FREE)
+        remap = np.full(self.size, FREE, dtype=np.int32)
+        remap[alive] = np.arange(len(alive), dtype=np.int32)
+        for name in ("b_code", "b_weight", "b_quality", "b_loc", "b_deep", "b_start"):
+            column = getattr(self, name)
+            column[:len(alive)] = column[alive]
+        self.size = len(alive)
+        stored = self._bundle != FREE
+        self._bundle[stored] = remap[self._bundle[stored]]
+
+
+    def _masks (self, locations: np.ndarray) -> None:
+        """ Method to recompute the bitmasks of some locations from their shelves """
+        occupied = (self._code[locations] != FREE).astype(np.uint64)
+        self.masks[locations] = (occupied << np.arange(self.shape[3], dtype=np.uint64)).sum(axis=-1, dtype=np.uint64)
+
+
+    def _insert (self, locations: np.ndarray, deeps: np.ndarray, starts: np.ndarray, 
+                codes: np.ndarray, weights: np.ndarray, qualities: np.ndarray) -> None:
+        """ Method to store many bundles at once (given as columns) """
+        n = len(locations)
+        if n == 0:
+            return
+        ids = self._reserve(n)
+        self.b_code[ids], self.b_weight[ids], self.b_quality[ids] = codes, weights, qualities
+        self.b_loc[ids], self.b_deep[ids], self.b_start[ids] = locations, deeps, starts
+
+        # Each bundle is repeated for each one of its shelves
+        lengths = np.array([c.length for c in self.products], dtype=np.int64)[codes]
+        rows = np.repeat(np.arange(n), lengths)
+        shelves = starts[rows] + np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        self._code[locations[rows], deeps[rows], shelves] = codes[rows]
+        self._bundle[locations[rows], deeps[rows], shelves] = ids[rows]
+        self._masks(np.unique(locations))
+
+
+    def add (self, index: int, bundle: Bundle, deep: int, start: int) -> None:
+        """ Method to store a bundle into a location, at a given depth and starting position """
+        k = int(self._reserve(1)[0])
+        code, length = self.code_id(bundle.code), bundle.code.length
+        self.b_code[k], self.b_weight[k], self.b_quality[k] = code, bundle.weight, bundle.quality
+        self.b_loc[k], self.b_deep[k], self.b_start[k] = index, deep, start
+        self._code[index, deep, start:start + length] = code
+        self._bundle[index, deep, start:start + length] = k
+        self.masks[index, deep] |= np.uint64(((1 << length) - 1) << start)
+        bundle.start, bundle.deep, bundle.loc = start, deep, self.locations[index]
+
+
+    def remove (self, index: int, deep: int, start: int) -> None:
+        """ Method to take the bundle stored into a location at a given depth and starting position """
+        k = int(self._bundle[index, deep, start])
+        length = self.products[self.b_code[k]].length
+        self._code[index, deep, start:start + length] = FREE
+        self._bundle[index, deep, start:start + length] = FREE
+        self.masks[index, deep] &= ~np.uint64(((1 << length) - 1) << start)
+        self.b_code[k] = FREE
+
+
+    def clear (self, first: int, last: int) -> None:
+        """ Method to empty the locations with index in [first, last) """
+        ids = np.unique(self._bundle[first:last])
+        ids = ids[ids != FREE]
+        self.b_code[ids] = FREE
+        self._code[first:last] = FREE
+        self._bundle[first:last] = FREE
+        self.masks[first:last] = 0
+        # The columns are compacted when most of them belong to bundles already taken
+        if self.size > 1024 and np.count_nonzero(self.b_code[:self.size] != FREE) < self.size // 2:
+            self._compact()
+
+
+    def views (self, ids: np.ndarray) -> List[Bundle]:
+        """ Method to materialize the Bundle objects of some stored bundles """
+        products, locations = self.products, self.locations
+        return [_View(k, products[c], w, q, s, d, locations[l]) 
+                for k, c, w, q, s, d, l in zip(ids.tolist(), self.b_code[ids].tolist(), self.b_weight[ids].tolist(), 
+                                               self.b_quality[ids].tolist(), self.b_start[ids].tolist(), 
+                                               self.b_deep[ids].tolist(), self.b_loc[ids].tolist())]
+
+
+    def items (self, index: int) -> Dict[int, List[Bundle]]:
+        """ The bundles stored into a location at each depth, in the order they were stored """
+        return {d : self.views(np.array(sorted(set(row) - {FREE}), dtype=np.int64)) 
+                for d, row in enumerate(self._bundle[index].tolist())}
+
+
+    def counts (self, index: int) -> Dict[Code, int]:
+        """ The number of bundles of each product stored into a location """
+        result: Dict[Code, int] = {}
+        for k in sorted(set(self._bundle[index].ravel().tolist()) - {FREE}):
+            code = self.products[self.b_code[k]]
+            result[code] = result.get(code, 0) + 1
+        return result
+
+
+    def free (self) -> np.ndarray:
+        """ The boolean mask of the free shelves """
+        return self.code == FREE
+
+
+    def fill (self, axis: Optional[Tuple[int, ...]] = None) -> np.ndarray:
+        """ 
+        Method to get the fill percentage of the warehouse. 
+
+        :param axis: The axes over which the percentage is computed (e.g., (1, 2, 3) for 
+                    the percentage of each rack). By default the whole warehouse.
+        """
+        return (self.code != FREE).mean(axis=axis)
+
+
+    def free_runs (self, length: int, quantity: int = 1) -> np.ndarray:
+        """
+        Method to get the boolean mask rack x location of the locations which have 
+        a run of at least `length` free shelves, in the first depth for one bundle, 
+        or in both the depths for two bundles.
+        """
+        _, _, deep, shelves = self.shape
+        if length > shelves or quantity > deep or quantity not in (1, 2):
+            return np.zeros(self.shape[:2], dtype=bool)
+        occupied = self.masks[:, 0] if quantity == 1 else self.masks[:, 0] | self.masks[:, 1]
+        free = ~occupied & np.uint64((1 << shelves) - 1)
+        return (_vruns(free, length) != 0).reshape(self.shape[:2])
+
+
+    def where (self, code: Code) -> np.ndarray:
+        """ Method to get the indices rack x location of the locations where a product is stored """
+        if (idx := self.codes.get(code)) is None:
+            return np.empty((0, 2), dtype=np.intp)
+        return np.argwhere((self.code == idx).any(axis=(2, 3)))
+
+
+    def find (self, code: Code, rack: Optional[int] = None) -> List[Bundle]:
+        """ 
+        Method to get the bundles of a product stored into the warehouse (or into 
+        one of its racks), in the order they were stored.
+        """
+        if (idx := self.codes.get(code)) is None:
+            return []
+        mask = self.b_code[:self.size] == idx
+        if rack is not None:
+            nlocations = self.shape[1]
+            locations = self.b_loc[:self.size]
+            mask &= (locations >= rack * nlocations) & (locations < (rack + 1) * nlocations)
+        return self.views(np.flatnonzero(mask))
+
+
+    def stock (self) -> Dict[Code, int]:
+        """ Method to get the number of stored bundles for each product """
+        codes = self.b_code[:self.size]
+        counts = np.bincount(codes[codes != FREE], minlength=len(self.products))
+        return {code : int(counts[i]) for i, code in enumerate(self.products)}
+
+
+    def snapshot (self, rack: int) -> Tuple[Tuple, ...]:
+        """ The bundles stored into a rack, as records (location index, depth, start, length, code, weight, quality) """
+        first = rack * self.shape[1]
+        locations = self.b_loc[:self.size]
+        ids = np.flatnonzero((self.b_code[:self.size] != FREE) & (locations >= first) & (locations < first + self.shape[1]))
+        ids = ids[np.lexsort((ids, self.b_deep[ids], locations[ids]))]
+        codes = [self.products[c] for c in self.b_code[ids].tolist()]
+        return tuple(zip((locations[ids] - first).tolist(), self.b_deep[ids].tolist(), self.b_start[ids].tolist(), 
+                         [c.length for c in codes], codes, self.b_weight[ids].tolist(), self.b_quality[ids].tolist()))
+
+
+    def restore (self, rack: int, snapshot: Tuple[Tuple, ...]) -> None:
+        """ Method to bring a rack back to the state described by a snapshot """
+        first = rack * self.shape[1]
+        self.clear(first, first + self.shape[1])
+        if not snapshot:
+            return
+        locations, deeps, starts, _, codes, weights, qualities = zip(*snapshot)
+        self._insert(first + np.asarray(locations, dtype=np.int64), np.asarray(deeps, dtype=np.int64), 
+                     np.asarray(starts, dtype=np.int64), np.array([self.code_id(c) for c in codes], dtype=np.int64),
+                     np.asarray(weights, dtype=np.float64), np.asarray(qualities, dtype=np.float64))
+
+
+    def _placements (self, length: int, quantity: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ 
+        Where `quantity` bundles long `length` would be placed into each location, 
+        following the same rules of Location.place.
+
+        :return: The arrays (feasible, start, depth) with one element for each location.
+        """
+        n, deep, shelves = len(self.masks), self.shape[2], self.shape[3]
+        full = np.uint64((1 << shelves) - 1)
+        free0 = ~self.masks[:, 0] & full
+        nowhere = (np.zeros(n, dtype=bool), np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64))
+        if length > shelves or quantity not in (1, 2) or (quantity == 2 and deep < 2):
+            return nowhere
+
+        if quantity == 2:
+            start = _vlowest(_vruns(free0 & ~self.masks[:, 1], length))
+            return start >= 0, start, np.zeros(n, dtype=np.int64)
+        start = _vlowest(_vruns(free0, length))
+        if deep == 1:
+            return start >= 0, start, np.zeros(n, dtype=np.int64)
+
+        # A single bundle goes into the second depth if there is room behind the 
+        # free span of the first depth where it would be placed
+        feasible = start >= 0
+        first = np.where(feasible, start, 0)
+        above = self.masks[:, 0] >> first.astype(np.uint64)
+        end = np.where(above != 0, first + _vlowest(above), shelves)
+        window = _vruns(~self.masks[:, 1] & full, length) & _vbelow(np.clip(end - length + 1, 0, shelves)) & ~_vbelow(first)
+        behind = _vlowest(window)
+        back = feasible & (behind >= 0)
+        return feasible, np.where(back, behind, start), back.astype(np.int64)
+
+
+    def warmup (self, code_prob, quantity_prob, quality_prob, percentage: float = 0.5) -> None:
+        """
+        Fill the warehouse up to a percentage of its capacity in bulk. At each round 
+        every location draws an input among the ones that can still be placed 
+        somewhere, and the locations where it fits take it, in random order, until 
+        the percentage is reached. If no input can be placed anywhere, the warehouse 
+        is left at the highest filling reachable.
+        """
+        n = len(self.masks)
+        target = percentage * self.code.size
+        filling = int(np.count_nonzero(self.code != FREE))
+        kinds = [(code, q, pc * pq) for code, pc in code_prob.items() for q, pq in quantity_prob[INPUT].items()]
+        lengths = np.array([code.length for code, _, _ in kinds], dtype=np.int64)
+        quantities = np.array([q for _, q, _ in kinds], dtype=np.int64)
+        codes = np.array([self.code_id(code) for code, _, _ in kinds], dtype=np.int64)
+        weights = np.array([code.weight for code, _, _ in kinds], dtype=np.float64)
+        qualities, quality_probs = (np.asarray(v, dtype=np.float64) for v in zip(*quality_prob[INPUT].items()))
+
+        while filling < target:
+            placements = [self._placements(code.length, q) for code, q, _ in kinds]
+            feasible = np.stack([p[0] for p in placements])
+            possible = np.flatnonzero(feasible.any(axis=1))
+            if len(possible) == 0:
+                break
+            probs = np.array([kinds[k][2] for k in possible])
+            drawn = possible[np.random.choice(len(possible), size=n, p=probs / probs.sum())]
+            locations = np.flatnonzero(feasible[drawn, np.arange(n)])
+            np.random.shuffle(locations)
+            k = drawn[locations]
+
+            # The last input taken may exceed the target, as in Simulation.warmup
+            amount = lengths[k] * quantities[k]
+            taken = np.cumsum(amount) - amount < target - filling
+            locations, k = locations[taken], k[taken]
+            filling += int(amount[taken].sum())
+
+            starts = np.stack([p[1] for p in placements])[k, locations]
+            deeps = np.stack([p[2] for p in placements])[k, locations]
+            quality = qualities[np.random.choice(len(qualities), size=len(k), p=quality_probs / quality_probs.sum())]
+            # The inputs of two bundles fill both the depths
+            pairs = quantities[k] == 2
+            self._insert(np.concatenate((locations, locations[pairs])), np.concatenate((deeps, np.ones(pairs.sum(), dtype=np.int64))), 
+                         np.concatenate((starts, starts[pairs])), np.concatenate((codes[k], codes[k][pairs])), 
+                         np.concatenate((weights[k], weights[k][pairs])), np.concatenate((quality, quality[pairs])))
+
+
+
+class ArrayLocation (object):
+    """ 
+    An instance of this class is a storage location whose content is kept in 
+    an Occupancy. It has the same interface of Location, but it only keeps its 
+    geometry and its index in the arrays.
+    """
+    __slots__ = ("rack", "position", "length", "deep", "shelves_size", "occupancy", "index", "_frozen")
+
+    def __init__(self, rack, position: Tuple[int,int,int], length: int, deep: int, shelves_size: int, 
+                occupancy: Occupancy, index: int):
+        self.rack = rack
+        self.position = tuple(position)
+        self.length, self.deep = length, deep
+        self.shelves_size = shelves_size
+        self.occupancy = occupancy
+        self.index = index
+        self._frozen = False
+        occupancy.locations[index] = self
+
+
+    @property 
+    def frozen (self) -> bool:
+        """ A frozen location is interested by a job and cannot be used by others """
+        return self._frozen
+
+    @frozen.setter
+    def frozen (self, value: bool) -> None:
+        self._frozen = value
+        self.rack.capacity.update(self)
+
+
+    @property
+    def items (self) -> Dict[int, List[Bundle]]:
+        return self.occupancy.items(self.index)
+
+
+    @property
+    def codes (self) -> Dict[Code, int]:
+        return self.occupancy.counts(self.index)
+
+
+    def _free (self, deep: int) -> int:
+        """ The bitmask of the free shelves at a depth """
+        return ((1 << self.length) - 1) & ~int(self.occupancy.masks[self.index, deep])
+
+
+    def capacity (self, quantity: int) -> int:
+        """ Method to get the length of the longest bundles that can be placed in a given quantity """
+        if quantity == 1:
+            return _largest(self._free(0))
+        if quantity == 2 and self.deep == 2:
+            return _largest(self._free(0) & self._free(1))
+        return 0
+
+
+    def keepCode (self, code: Code) -> bool:
+        """ Method to check if a certain product is stored in the location """
+        return code in self.codes
+
+
+    def reset (self) -> None:
+        """ Method to empty the location """
+        self.occupancy.clear(self.index, self.index + 1)
+        self._frozen = False
+
+
+    def store (self, bundle: Bundle, deep: int, start: int, length: int) -> None:
+        """ Method to store a bundle at a given depth and starting position """
+        self.occupancy.add(self.index, bundle, deep, start)
+
+
+    def place (self, job: Job) -> bool:
+        """ Method used to place the bundles moved by the Job into the Location """
+        n, length = job.quantity, job.length
+        add, index = self.occupancy.add, self.index
+
+        if n == 2 and self.deep == 2:
+            # look for a space free in both the depths
+            runs = _runs(self._free(0) & self._free(1), length)
+            if not runs:
+                return False
+            _start = _lowest(runs)
+            add(index, job.bundles[0], 0, _start)
+            add(index, job.bundles[1], 1, _start)
+
+        elif n == 1 and self.deep == 1:
+            runs = _runs(self._free(0), length)
+            if not runs:
+                return False
+            _start = _lowest(runs)
+            add(index, job.bundles[0], 0, _start)
+
+        elif n == 1 and self.deep == 2:
+            # if there's no space in first depth the bundle cannot be placed
+            runs = _runs(self._free(0), length)
+            if not runs:
+                return False
+            s1 = _lowest(runs)
+
+            # Placement in second depth if there is a free space 
+            # behind the first space of the first depth...
+            above = int(self.occupancy.masks[index, 0]) >> s1
+            end = s1 + _lowest(above) if above else self.length
+            window = _runs(self._free(1), length) & ((1 << (end - length + 1)) - 1) & ~((1 << s1) - 1)
+            if window:
+                _start = _lowest(window)
+                add(index, job.bundles[0], 1, _start)
+            else:
+                # Bundle placed in first depth...
+                _start = s1
+                add(index, job.bundles[0], 0, _start)
+
+        else:
+            return False
+
+        self.rack.capacity.update(self)
+        x, y, z = self.position
+        job.destination = (x, y, z + (length/2 + _start) * self.shelves_size)
+        return True
+
+
+    def take (self, job: Job) -> None:
+        """ Method used to take the bundles required by the Job from the Location """
+        for bundle in job.bundles:
+            self.occupancy.remove(self.index, bundle.deep, bundle.start)
+        self.rack.capacity.update(self)
+        x, y, z = self.position
+        job.destination = (x, y, z + (job.length/2 + job.bundles[0].start) * self.shelves_size)
+        return True
@@ -18,10 +18,12 @@ Author's website: https://mattianeroni.github.io
 %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 """
 import numpy as np
-from typing import Tuple, Sequence, Generator
+from typing import Dict, Optional, Tuple, Sequence, Generator
 
 from .location import Location
-from .source import Job 
+from .occupancy import Occupancy, ArrayLocation
+from .capacity import Capacity
+from .source import Job, Bundle
 from .machine import Crane, Lift 
 
 
@@ -32,27 +34,91 @@ class Rack (object):
     def __init__(self, *, ncorridors: int, nlevels: int, corridor_size: int, level_size: int, 
                 position: Tuple[int, int, int], 
                 nshelves: int, shelves_deep: int, shelves_size: int, 
-                crane: Crane, lifts: Sequence[Lift]):
+                crane: Crane, lifts: Sequence[Lift], 
+                occupancy: Optional[Occupancy] = None, index: int = 0):
+        """
+        :param occupancy: The arrays where the content of the locations is stored. By 
+                    default each location keeps its own content.
+        :param index: The index of the rack in the occupancy.
+        """
         self.crane = crane
         self.lifts = lifts
-        self.position = np.asarray(position)
-        self.locations = tuple(Location(self, [x*corridor_size, y*level_size, position[2]], nshelves, shelves_deep, shelves_size)
-                                      for y in range(nlevels)
-                                    for x in range(ncorridors)
-                                 for _ in range(2))
+        self.position = tuple(position)
+        self.inventory = None
+        self.occupancy = occupancy
+        self.index = index
+        positions = tuple((x*corridor_size, y*level_size, position[2])
+                                  for y in range(nlevels)
+                                for x in range(ncorridors)
+                             for _ in range(2))
+        if occupancy is None:
+            self.locations = tuple(Location(self, p, nshelves, shelves_deep, shelves_size) for p in positions)
+        else:
+            first = index * len(positions)
+            self.locations = tuple(ArrayLocation(self, p, nshelves, shelves_deep, shelves_size, occupancy, first + i) 
+                                   for i, p in enumerate(positions))
+        self.capacity = Capacity(self.locations)
+
+        # The locations sorted by distance from the reference positions
+        self.orderings: Dict[Tuple[int, int, int], Tuple[Location, ...]] = {}
+        for lift in lifts:
+            self.ordering(lift.up)
+            self.ordering(lift.down)
+
+
+    def ordering (self, position: Tuple[int, int, int]) -> Tuple[Location, ...]:
+        """ 
+        Method to get the locations sorted by distance from a reference position. 
+        The ordering is computed the first time a position is used and then cached.
+        """
+        key = tuple(position)
+        if (locations := self.orderings.get(key)) is None:
+            distances = np.abs(np.asarray([loc.position for loc in self.locations]) - np.asarray(position)).sum(axis=1)
+            locations = self.orderings[key] = tuple(self.locations[i] for i in np.argsort(distances, kind="stable"))
+        return locations
+
+
+    def snapshot (self) -> Tuple[Tuple, ...]:
+        """ 
+        Method to get a compact representation of the bundles stored into the rack, 
+        as records (location index, depth, start, length, code, weight, quality).
+        """
+        if self.occupancy is not None:
+            return self.occupancy.snapshot(self.index)
+        return tuple((i, bundle.deep, bundle.start, bundle.length, bundle.code, bundle.weight, bundle.quality)
+                    for i, loc in enumerate(self.locations)
+                    for items in loc.items.values()
+                    for bundle in items)
+
+
+    def restore (self, snapshot: Tuple[Tuple, ...]) -> None:
+        """ 
+        Method to bring the rack back to the state described by a snapshot. 
+        The inventory bound to the rack is dropped, and the capacity index is rebuilt.
+        """
+        self.inventory = None
+        locations = self.locations
+        if self.occupancy is not None:
+            self.occupancy.restore(self.index, snapshot)
+            for loc in locations:
+                loc._frozen = False
+        else:
+            for loc in locations:
+                loc.reset()
+            for i, deep, start, length, code, weight, quality in snapshot:
+                loc = locations[i]
+                loc.store(Bundle(code, weight, quality), deep, start, length)
+                loc.codes[code] += 1
+        self.capacity = Capacity(locations)
 
 
     def place (self, job: Job, position : Tuple[int, int, int] = (0,0,0)) -> Generator[Location, None, None]:
-        pos = np.asarray(position)
-        locations = sorted(self.locations, key=lambda loc: (pos - loc.position).sum())
-        for loc in locations:
+        for loc in self.ordering(position):
             if not loc.frozen and loc.place(job):
                 yield loc
 
 
     def take (self, job: Job, position : Tuple[int, int, int] = (0,0,0)) -> Generator[Location, None, None]:
-        pos = np.asarray(position)
-        locations = sorted(self.locations, key=lambda loc: (pos - loc.position).sum())
-        for loc in locations:
+        for loc in self.ordering(position):
             if not loc.frozen and loc.take(job):
                 yield loc
\ No newline at end of file
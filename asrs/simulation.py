@@ -18,17 +18,18 @@ Author's website: https://mattianeroni.github.io
 %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 """
 import random
+import itertools
 import collections
 import numpy as np
 
 from asrs import priority, source, kind
+from asrs.inventory import Inventory
+from asrs.capacity import Capacity
+from asrs.deferred import Deferred
+from asrs import metrics as _metrics
+from asrs import events
 import algorithm
-
-
-# Events registed for jobs
-START = "START"
-END = "END"
-
+from algorithm.exceptions import DominatedSolution
 
 
 class Config:
@@ -42,56 +43,271 @@ class Config:
 class Simulation (object):
     """ An instance of this class represents the simulation of the system """
 
-    def __init__ (self, env, config, *, shuttles, racks, depots, uploadTime=20.0):
+    def __init__ (self, env, config, *, shuttles, racks, depots, uploadTime=20.0, metrics=_metrics.OFF, lean=False, log=None):
+        """
+        :param log: An EventLog where the phases of all the jobs are recorded (if any). 
+                    Machines are identified by their index in self.machines.
+        """
         self.env = env
         self.config = config 
         self.shuttles = shuttles
         self.racks = racks
         self.depots = depots
+        self.inventory = Inventory(racks)
+        # The arrays where the racks are stored (if they are)
+        self.occupancy = racks[0].occupancy if racks else None
         self.uploadTime = uploadTime
+        # In lean mode each compound movement is a single timeout computed analytically
+        self.lean = lean
+
+        for rack in racks:
+            for depot in depots:
+                rack.ordering(depot.position)
+        self.tabulate()
 
         self.done = collections.deque()
         self.wasted = collections.deque()
+        self.deferred = Deferred()
+        self.metrics = _metrics.Metrics(self, metrics) if metrics != _metrics.OFF else None
+
+        self.log = log
+        self.ids = itertools.count()
+        self.machines = shuttles + tuple(m for rack in racks for m in (rack.crane,) + tuple(rack.lifts))
+        self.machine_ids = {m : i for i, m in enumerate(self.machines)}
+
+
+    def tabulate (self):
+        """ 
+        Method to precompute the travel times of all the machines between all 
+        the positions they can reach in the layout.
+        """
+        racks, depots = self.racks, self.depots
+
+        for shuttle in self.shuttles:
+            shuttle.tabulate([shuttle.position[2]] + [d.position[2] for d in depots] + [l.down[2] for r in racks for l in r.lifts])
+
+        for rack in racks:
+            crane = rack.crane
+            for lift in rack.lifts:
+                lift.tabulate((lift.position[1], lift.up[1], lift.down[1]))
+
+            # The coordinates where a bundle can be picked or dropped
+            points = [crane.mx.position] + [l.up for l in rack.lifts]
+            shelves = {(loc.position[2], loc.length, loc.shelves_size) for loc in rack.locations}
+            crane.mx.tabulate([p[0] for p in points] + [loc.position[0] for loc in rack.locations])
+            crane.my.tabulate([p[1] for p in points] + [loc.position[1] for loc in rack.locations])
+            crane.mz.tabulate([p[2] for p in points] + [z + (length/2 + start) * size
+                                                        for z, n, size in shelves
+                                                        for length in range(1, n + 1)
+                                                        for start in range(n - length + 1)])
 
 
     def warmup (self, code_prob, depot_prob, quantity_prob, quality_prob, percentage = 0.5):
-        capacity = sum(loc.length * loc.deep for rack in self.racks for loc in rack.locations)
+        """
+        Fill the warehouse up to a percentage of its capacity. Each new bundle is placed 
+        into a location picked at random among the ones that can host it (using the 
+        capacity index of the racks), so no placement attempt is wasted. 
+
+        If at some point no location can host any of the possible bundles, the 
+        warehouse is left at the highest filling reachable.
+
+        When the racks are stored in arrays, the warehouse is filled in bulk 
+        by the Occupancy instead (see Occupancy.warmup).
+        """
+        racks = self.racks
+        if self.occupancy is not None:
+            self.occupancy.warmup(code_prob, quantity_prob, quality_prob, percentage=percentage)
+            for rack in racks:
+                rack.capacity = Capacity(rack.locations)
+            return
+
+        capacity = sum(loc.length * loc.deep for rack in racks for loc in rack.locations)
+        target = percentage * capacity
+
+        # The kinds of input (length, quantity) that could still be placed
+        feasible = {(code.length, q) for code in code_prob for q in quantity_prob[kind.INPUT]}
         filling = 0
-        while filling / capacity < percentage:
-            rack = random.choice(list(self.racks))
-            loc = random.choice(list(rack.locations))
+        while filling < target and feasible:
             job = source.single_job(depot_prob[kind.INPUT], code_prob, quantity_prob, quality_prob, kind_prob={kind.INPUT: 1.0})
+            counts = [rack.capacity.count(job.length, job.quantity) for rack in racks]
+            if (total := sum(counts)) == 0:
+                feasible.discard((job.length, job.quantity))
+                continue
+
+            # pick a rack with a probability proportional to its candidate locations
+            r = random.randrange(total)
+            for rack, count in zip(racks, counts):
+                if r < count:
+                    break
+                r -= count
+
+            loc = rack.capacity.sample(job.length, job.quantity)
             if loc.place(job):
                 filling += job.length * job.quantity
 
 
-    def __call__ (self, jobs):
+    def __call__ (self, jobs, incumbent=None):
+        """
+        The process that dispatches the jobs at their arrival. 
+
+        :param incumbent: The best makespan found so far. If given, a DominatedSolution 
+                        is raised as soon as a lower bound of the makespan reaches it.
+        """
+        env = self.env
+        if incumbent is None:
+            for job in jobs:
+                yield env.timeout(max(0, job.arrival - env.now))
+                yield from self.dispatch(job)
+            return
+
+        jobs = tuple(jobs)
+        for job, (work, latest) in zip(jobs, self.bounds(jobs)):
+            if max(env.now + work, latest) >= incumbent:
+                raise DominatedSolution()
+            yield env.timeout(max(0, job.arrival - env.now))
+            yield from self.dispatch(job)
+
+
+    def bounds (self, jobs):
+        """
+        Lower bounds of the makespan before dispatching each job. Every job keeps the 
+        shuttle of its depot busy for at least two uploads, and it cannot have it before 
+        its arrival, nor before the current time. The jobs already dispatched are not 
+        considered, so the bound is valid at any time.
+
+        :return: For each job, the couple (work, latest) such that the makespan is 
+                at least max(now + work, latest).
+        """
+        work = 2 * self.uploadTime
+        # Number of jobs still to dispatch and latest completion due to arrivals, per depot
+        count = [0] * len(self.depots)
+        latest = [0.0] * len(self.depots)
+        suffix = collections.deque()
+        for job in reversed(jobs):
+            d = job.depot
+            count[d] += 1
+            latest[d] = max(latest[d], job.arrival + count[d] * work)
+            suffix.appendleft((max(count) * work, max(latest)))
+        return tuple(suffix)
+
+
+    def dispatch (self, job):
+        """ Process a job. If it is not possible to process it now, the job is deferred. """
         env, Br, Bb = self.env, self.config.Br, self.config.Bb
-        for i, job in enumerate(jobs):
             
-            yield env.timeout(max(0, job.arrival - env.now))
+        if job.kind == kind.INPUT:
+            rack, loc = algorithm.process_input(job, self.racks, Br)
             
-            if job.kind == kind.INPUT:
-                rack, loc = algorithm.process_input(job, self.racks, Br)
-                
-                if loc is None:
-                    algorithm.postpone(i, job, jobs)
-                else:
-                    env.process (self.execute(job, rack, loc))
+            if loc is None:
+                self.deferred.park(job)
+            else:
+                env.process (self.execute(job, rack, loc))
 
 
-            elif job.kind == kind.OUTPUT:
-                resulting_jobs = algorithm.process_output(job, self.racks, Br, Bb, self.config.weight_error) 
-            
-                if resulting_jobs is None:
-                    algorithm.postpone(i, job, jobs)
-                else:
-                    for j in resulting_jobs:
-                        loc = j.bundles[0].loc
-                        _res = loc.take(j)
-                        assert _res == True
-                        env.process (self.execute(j, loc.rack, loc))
-                        yield env.timeout(0)
+        elif job.kind == kind.OUTPUT:
+            resulting_jobs = algorithm.process_output(job, self.racks, Br, Bb, self.config.weight_error) 
+        
+            if resulting_jobs is None:
+                self.deferred.park(job)
+            else:
+                for j in resulting_jobs:
+                    loc = j.bundles[0].loc
+                    _res = loc.take(j)
+                    assert _res == True
+                    env.process (self.execute(j, loc.rack, loc))
+                    yield env.timeout(0)
+
+
+    def wake (self, location):
+        """ 
+        Method called when a location is released. The oldest deferred input that 
+        fits into the location, and the oldest deferred outputs requiring the products 
+        stored into it, are processed again.
+        """
+        deferred = self.deferred
+        if not deferred:
+            return
+        if (job := deferred.wake_input(location)) is not None:
+            self.env.process(self.dispatch(job))
+        for code, count in tuple(location.codes.items()):
+            if count > 0 and (job := deferred.wake_output(code)) is not None:
+                self.env.process(self.dispatch(job))
+
+
+    def record (self, job, event, machine=None):
+        """ Record an event of a job into the log (if any) """
+        if self.log is not None:
+            self.log.add(job.id, event, events.NONE if machine is None else self.machine_ids[machine], self.env.now)
+
+
+    def request (self, machine, job=None):
+        """ Make a request to a machine """
+        req = machine.request(priority=priority.NORMAL, preempt=False)
+        if self.metrics is not None:
+            self.metrics.request(machine, req)
+        if self.log is not None and job is not None:
+            self.record(job, events.REQUEST, machine)
+            req.callbacks.append(lambda _: self.record(job, events.GRANT, machine))
+        return req
+
+
+    def release (self, machine, req, job=None):
+        """ Release a machine """
+        machine.release(req)
+        if self.metrics is not None:
+            self.metrics.release(machine, req)
+        if job is not None:
+            self.record(job, events.RELEASE, machine)
+
+
+    def _delay (self, delays):
+        """ 
+        A single timeout lasting the given consecutive delays. The delays are summed
+        in the same order simpy would do with consecutive timeouts, so that 
+        the ending time is the same.
+        """
+        now = t = self.env.now
+        for d in delays:
+            t += d
+        return self.env.timeout(t - now)
+
+
+    def _after (self, req, delays):
+        """ Wait for a request and then for the delays computed once it is granted """
+        yield req
+        yield self._delay(delays())
+
+
+    def move (self, machine, position):
+        """ The event of a machine moving to a position """
+        if self.lean:
+            return self._delay((machine.travel(position),))
+        return self.env.process(machine.move(position))
+
+
+    def prepare (self, machine, position, req):
+        """ The process of a machine reaching a position once the request is granted """
+        if self.lean:
+            return self.env.process(self._after(req, lambda: (machine.travel(position),)))
+        return self.env.process(machine.prepare(position, req))
+
+
+    def prepareIn (self, crane, position, req):
+        if self.lean:
+            return self.env.process(self._after(req, lambda: crane.prepareInDelays(position)))
+        return self.env.process(crane.prepareIn(position, req))
+
+
+    def takeIn (self, crane, job):
+        if self.lean:
+            return self._delay(crane.takeInDelays(job, self.uploadTime))
+        return self.env.process(crane.takeIn(job, self.uploadTime))
+
+
+    def takeOut (self, crane, position, job):
+        if self.lean:
+            return self._delay(crane.takeOutDelays(position, job, self.uploadTime))
+        return self.env.process(crane.takeOut(position, job, self.uploadTime))
 
 
     def execute (self, job, rack, location):
@@ -99,7 +315,10 @@ class Simulation (object):
         shuttle = self.shuttles[job.depot]
         depot = self.depots[job.depot]
         #rack, location = self.getRack(job, self.racks[0].lifts[job.depot].up)
-        job.history[START] = int(env.now)
+        job.started = int(env.now)
+        job.rack = self.racks.index(rack)
+        job.id = next(self.ids)
+        self.record(job, events.START)
 
         #if location is None:
         #    self.wasted.append(job)
@@ -109,45 +328,62 @@ class Simulation (object):
         crane = rack.crane
         #location.frozen = True
         if job.kind == kind.INPUT:
-            yield (reqs := shuttle.request(priority=priority.NORMAL, preempt=False))
-            yield env.process(shuttle.move(depot.position))
-            reql = lift.request(priority=priority.NORMAL, preempt=False)
-            lift_preparation = env.process(lift.prepare(lift.down, reql))
+            yield (reqs := self.request(shuttle, job))
+            yield self.move(shuttle, depot.position)
+            reql = self.request(lift, job)
+            lift_preparation = self.prepare(lift, lift.down, reql)
             yield env.timeout(self.uploadTime)
             depot.pop(env.now)
-            yield env.process(shuttle.move(lift.down))
+            yield self.move(shuttle, lift.down)
+            self.record(job, events.ARRIVED, shuttle)
             yield lift_preparation
-            reqc = crane.request(priority=priority.NORMAL, preempt=False)
-            crane_preparation = env.process(crane.prepareIn(lift.up, reqc))
+            reqc = self.request(crane, job)
+            crane_preparation = self.prepareIn(crane, lift.up, reqc)
             yield env.timeout(self.uploadTime)
-            shuttle.release(reqs)
-            yield env.process(lift.move(lift.up))
+            self.release(shuttle, reqs, job)
+            yield self.move(lift, lift.up)
+            self.record(job, events.ARRIVED, lift)
             yield crane_preparation
             yield env.timeout(self.uploadTime)
-            lift.release(reql)
-            yield env.process(crane.takeIn(job, self.uploadTime))
-            crane.release(reqc)
+            self.release(lift, reql, job)
+            yield self.takeIn(crane, job)
+            self.record(job, events.STORED, crane)
+            self.release(crane, reqc, job)
             location.frozen = False
+            self.wake(location)
+
+            self.done.append(job)
+            job.ended = int(env.now)
+            self.record(job, events.END)
+            if self.metrics is not None:
+                self.metrics.completed(job, env.now)
 
         elif job.kind == kind.OUTPUT:
-            yield (reqc := crane.request(priority=priority.NORMAL, preempt=False))
-            reql = lift.request(priority=priority.NORMAL, preempt=False)
-            lift_preparation = env.process(lift.prepare(lift.up, reql))
-            yield env.process(crane.takeOut(lift.up, job, self.uploadTime))
+            yield (reqc := self.request(crane, job))
+            reql = self.request(lift, job)
+            lift_preparation = self.prepare(lift, lift.up, reql)
+            yield self.takeOut(crane, lift.up, job)
+            self.record(job, events.RETRIEVED, crane)
             location.frozen = False
+            self.wake(location)
             yield lift_preparation
-            reqs = shuttle.request(priority=priority.NORMAL, preempt=False)
-            shuttle_prepare = env.process(shuttle.prepare(lift.down, reqs))
+            reqs = self.request(shuttle, job)
+            shuttle_prepare = self.prepare(shuttle, lift.down, reqs)
             yield env.timeout(self.uploadTime)
-            crane.release(reqc)
-            yield env.process(lift.move(lift.down))
+            self.release(crane, reqc, job)
+            yield self.move(lift, lift.down)
+            self.record(job, events.ARRIVED, lift)
             yield shuttle_prepare
             yield env.timeout(self.uploadTime)
-            lift.release(reql)
-            yield env.process(shuttle.move(depot.position))
+            self.release(lift, reql, job)
+            yield self.move(shuttle, depot.position)
+            self.record(job, events.ARRIVED, shuttle)
             yield env.timeout(self.uploadTime)
             depot.pop(env.now)
-            shuttle.release(reqs)
+            self.release(shuttle, reqs, job)
 
             self.done.append(job)
-            job.history[END] = int(env.now)
+            job.ended = int(env.now)
+            self.record(job, events.END)
+            if self.metrics is not None:
+                self.metrics.completed(job, env.now)
@@ -20,7 +20,7 @@ Author's website: https://mattianeroni.github.io
 import random
 import numpy as np
 
-from typing import Optional
+from typing import Optional, Dict, Tuple
 
 from asrs import kind
 
@@ -77,14 +77,31 @@ def __select (options : dict):
 class Code (object):
     """
     An instance of this class represents a type of produt stored inside the warehouse.
+    Codes are interned: asking twice for the same length and weight returns the same 
+    object, also after a copy or a pickling of the jobs.
     """
-    def __init__(self, length : int, weight : int):
-        self.length = length 
-        self.weight = weight
+    __slots__ = ("length", "weight")
+
+    _interned: Dict[Tuple[int, int], "Code"] = {}
+
+    def __new__(cls, length : int, weight : int):
+        if (code := cls._interned.get((length, weight))) is None:
+            code = cls._interned[length, weight] = super(Code, cls).__new__(cls)
+            code.length = length 
+            code.weight = weight
+        return code
+
+    def __reduce__(self):
+        return (Code, (self.length, self.weight))
+
+    def __repr__(self):
+        return f"Code(length={self.length}, weight={self.weight})"
     
 
 class Bundle (object):
     """ An instance of this class represents one of the bundles handled by the system """
+    __slots__ = ("code", "weight", "quality", "start", "deep", "loc", "taken")
+
     def __init__(self, code: Code, weight: int, quality: int, start: Optional[int] = None):
         self.code = code 
         self.weight = weight 
@@ -112,6 +129,9 @@ class Job (object):
     """
     Operation to be made by the warehouse.
     """
+    __slots__ = ("arrival", "depot", "kind", "code", "length", "weight", "quality", "quantity", 
+                "bundles", "destination", "rack", "id", "started", "ended")
+
     def __init__(self, arrival: float, depot: int, _kind: str, code: Code, 
                 length: int, weight: int, quality: int, quantity: int):
         """
@@ -124,8 +144,11 @@ class Job (object):
         :param quantity: The number of moved bundles (one or two).
 
         :attr bundle: A matricial representation of bundles.
-        :attr history: A collection of events that interest the job.
         :attr destination: The position interested by the operation.
+        :attr rack: The index of the rack interested by the operation.
+        :attr id: The identifier of the job in the event log of the simulation.
+        :attr started: The time the job started to be executed.
+        :attr ended: The time the job was completed.
         """
         self.arrival = arrival
         self.depot = depot
@@ -140,14 +163,23 @@ class Job (object):
         self.bundles = tuple( Bundle(code, weight // quantity, quality) for _ in range(quantity)) if _kind == kind.INPUT else tuple()
 
         self.destination = None
-        self.history = dict()
+        self.rack = None
+        self.id = None
+        self.started = None
+        self.ended = None
 
     def __copy__(self):
         cls = self.__class__
         result = cls.__new__(cls)
-        result.__dict__.update(self.__dict__)
+        for attr in self.__slots__:
+            setattr(result, attr, getattr(self, attr))
+        # the bundles are modified by the simulation and they cannot be shared
+        result.bundles = tuple(Bundle(b.code, b.weight, b.quality) for b in self.bundles)
         result.destination = None 
-        result.history = {} 
+        result.rack = None
+        result.id = None
+        result.started = None
+        result.ended = None
         return result
 
 
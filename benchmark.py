@@ -0,0 +1,248 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import json
+import time
+import random
+import argparse
+import tracemalloc
+import platform
+import subprocess
+import numpy as np
+import simpy
+
+import asrs
+import algorithm
+from asrs.kind import INPUT, OUTPUT
+from asrs.source import Code, single_job
+
+
+# The initial filling levels of the warehouse used for the benchmarks
+FILLING = (0.2, 0.5, 0.8, 0.95)
+
+depot_prob = { INPUT : {0 : 0.25,  2 : 0.25}, OUTPUT : {1 : 0.25, 3 : 0.25} }
+code_prob = {Code(6, 1000) : 0.5, Code(3, 500) : 0.2, Code(5, 600) : 0.1, Code(3, 1000) : 0.05, Code(6, 500) : 0.05}
+quantity_prob = {INPUT : {1 : 0.5, 2 : 0.5}, OUTPUT : {1 : 0.5, 2 : 0.5}}
+quality_prob = {INPUT : {1 : 0.33, 2 : 0.33, 3 : 0.34}, OUTPUT : {1 : 0.33, 2 : 0.33, 3 : 0.34}}
+
+
+
+class Timer (object):
+    """ 
+    Accumulate the time spent inside a block of code executed many times. 
+    When tracemalloc is tracing, the peak of memory allocated inside the 
+    block (above the memory in use when it is entered) is accumulated too. 
+    This is not the total allocated, since memory freed and allocated again 
+    within the block is counted once.
+    """
+    def __init__(self):
+        self.ops, self.elapsed, self.peak = 0, 0.0, 0
+        self.tracing = tracemalloc.is_tracing()
+
+    def __enter__(self):
+        if self.tracing:
+            tracemalloc.reset_peak()
+            self._memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.elapsed += time.perf_counter() - self._start
+        if self.tracing:
+            self.peak += tracemalloc.get_traced_memory()[1] - self._memory
+        self.ops += 1
+
+    def result (self, name, filling):
+        return {
+            "benchmark" : name, 
+            "filling" : filling, 
+            "ops" : self.ops,
+            "ops_per_sec" : self.ops / self.elapsed if self.ops > 0 else None,
+            "peak_bytes_per_op" : self.peak / self.ops if self.ops > 0 else None,
+        }
+
+
+
+def warehouse (filling, deep=2):
+    """ Build the standard layout and fill it up to the required percentage """
+    env = simpy.Environment()
+    sim = asrs.Simulation(
+        env,
+        config = asrs.simulation.Config(Bb = 0.9, Br = 0.7), 
+        shuttles = tuple(asrs.Shuttle(env, 2.0, 0.5, (i*30, 0, 0)) for i in range(4)),
+        racks = tuple(asrs.Rack(ncorridors=30, nlevels=10, corridor_size=4, level_size=1,
+            position=(0, 0, i*12), nshelves=6, shelves_deep=deep, shelves_size=2, 
+            crane=asrs.Crane(env, (1.3,1.3,1.3), (0.3,0.3,0.3), (0,10,i*12)),
+            lifts=tuple(asrs.Lift(env, 0.6, 0.3, (j*30, 0, i*12), (j*30, 10, i*12), (j*30, 0, i*12)) for j in range(4))
+        )
+        for i in range(3)),
+        depots = tuple(asrs.Depot((i*30, 0, 0)) for i in range(4)),
+        uploadTime = 20.0
+    )
+    quantities = quantity_prob if deep == 2 else {k : {1 : 1.0} for k in quantity_prob}
+    sim.warmup(code_prob, depot_prob, quantities, quality_prob, percentage=filling)
+    return sim
+
+
+def _input (quantity):
+    return single_job(depot_prob[INPUT], code_prob, {INPUT : {quantity : 1.0}}, quality_prob, {INPUT : 1.0})
+
+
+def _output ():
+    return single_job(depot_prob[OUTPUT], code_prob, quantity_prob, quality_prob, {OUTPUT : 1.0})
+
+
+def _release (jobs):
+    """ Undo the effects of process_output on the warehouse """
+    for job in jobs:
+        for bundle in job.bundles:
+            bundle.taken = False
+            bundle.loc.frozen = False
+
+
+
+def bench_location (sim, filling, quantity, n):
+    """ Location.place and Location.take on random locations (every placed job is taken back) """
+    locations = [loc for rack in sim.racks for loc in rack.locations]
+    deep = locations[0].deep
+    place, take = Timer(), Timer()
+    for _ in range(n):
+        loc, job = random.choice(locations), _input(quantity)
+        with place:
+            placed = loc.place(job)
+        if placed:
+            with take:
+                loc.take(job)
+    return [place.result(f"Location.place[quantity={quantity},deep={deep}]", filling), 
+            take.result(f"Location.take[quantity={quantity},deep={deep}]", filling)]
+
+
+def bench_bra (filling, size, taken, n):
+    """ Biased-randomised selection of `taken` elements out of `size` """
+    timer, options = Timer(), list(range(size))
+    for _ in range(n):
+        with timer:
+            for _, _ in zip(range(taken), algorithm.bra(options, 0.3)):
+                pass
+    return [timer.result(f"bra[size={size},taken={taken}]", filling)]
+
+
+def bench_input (sim, filling, n):
+    """ Selection of the location for an input job """
+    timer, Br = Timer(), sim.config.Br
+    for _ in range(n):
+        job = _input(random.choice((1, 2)))
+        with timer:
+            rack, loc = algorithm.process_input(job, sim.racks, Br)
+        if loc is not None:
+            loc.take(job)
+            loc.frozen = False
+    return [timer.result("process_input", filling)]
+
+
+def bench_output (sim, filling, n):
+    """ Selection of the bundles for an output job, and their aggregation into jobs """
+    select, aggregate = Timer(), Timer()
+    Br, Bb, error = sim.config.Br, sim.config.Bb, sim.config.weight_error
+    for _ in range(n):
+        job = _output()
+        with select:
+            jobs = algorithm.process_output(job, sim.racks, Br, Bb, error)
+        if jobs is not None:
+            _release(jobs)
+            bundles = {bundle for j in jobs for bundle in j.bundles}
+            with aggregate:
+                jobs = algorithm.utils._aggregate(job, bundles)
+            _release(jobs)
+    return [select.result("process_output", filling), aggregate.result("_aggregate", filling)]
+
+
+
+def run (n, seed):
+    """ 
+    Execute all the benchmarks twice with the same seed: the first time to 
+    measure the speed, the second time (with tracemalloc on) to measure the 
+    peak of memory allocated per operation. 
+    """
+    results = _run(n, seed)
+    tracemalloc.start()
+    try:
+        memory = _run(n, seed)
+    finally:
+        tracemalloc.stop()
+    for r, m in zip(results, memory):
+        r["peak_bytes_per_op"] = m["peak_bytes_per_op"]
+    return results
+
+
+def _run (n, seed):
+    results = []
+    for filling in FILLING:
+        random.seed(seed)
+        np.random.seed(seed)
+        sim, single = warehouse(filling), warehouse(filling, deep=1)
+        results += bench_location(sim, filling, 2, n)
+        results += bench_location(sim, filling, 1, n)
+        results += bench_location(single, filling, 1, n)
+        results += bench_input(sim, filling, n)
+        results += bench_output(sim, filling, n)
+        results += bench_bra(filling, 100, 100, n)
+        results += bench_bra(filling, 100, 5, n)
+    return results
+
+
+def commit ():
+    """ The commit the benchmark is executed on """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare (base, results):
+    """ Print the speedup of the results with respect to a previous execution """
+    before = {(r["benchmark"], r["filling"]) : r for r in base["results"]}
+    for r in results:
+        b = before.get((r["benchmark"], r["filling"]))
+        if b is not None and r["ops_per_sec"] and b["ops_per_sec"]:
+            print(f"{r['benchmark']:45} {r['filling']:5.2f}  speed x{r['ops_per_sec'] / b['ops_per_sec']:6.2f}  "
+                  f"peak bytes/op {b['peak_bytes_per_op']:9.1f} -> {r['peak_bytes_per_op']:9.1f}")
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the placement, retrieval and selection hot paths.")
+    parser.add_argument("output", nargs="?", default="bench_output.json", help="The json file where results are written.")
+    parser.add_argument("-n", type=int, default=2000, help="The number of operations for each benchmark.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", help="The json file of a previous execution to compare with.")
+    args = parser.parse_args()
+
+    results = run(args.n, args.seed)
+    for r in results:
+        if r["ops"] > 0:
+            print(f"{r['benchmark']:45} {r['filling']:5.2f}  {r['ops_per_sec']:12.0f} ops/s  {r['peak_bytes_per_op']:9.1f} peak bytes/op")
+
+    with open(args.output, "w") as file:
+        json.dump({"commit" : commit(), "python" : platform.python_version(), "n" : args.n, 
+                   "seed" : args.seed, "results" : results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), results)
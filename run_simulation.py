@@ -19,6 +19,7 @@ Author's website: https://mattianeroni.github.io
 """
 import simpy 
 import asrs
+from asrs import export, metrics
 from asrs.kind import INPUT, OUTPUT
 from asrs.source import source, Code
 
@@ -49,18 +50,7 @@ if __name__ == "__main__":
 
     env = simpy.Environment()
 
-    sim = asrs.Simulation(
-        env,
-        shuttles = tuple(asrs.Shuttle(env, 2.0, 0.5, (i*30, 0, 0)) for i in range(4)),
-        racks = tuple(asrs.Rack(ncorridors=30, nlevels=10, corridor_size=4, level_size=1,
-            position=(0, 0, i*12), nshelves=6, shelves_deep=2, shelves_size=2, 
-            crane=asrs.Crane(env, (1.3,1.3,1.3), (0.3,0.3,0.3), (0,10,i*12)),
-            lifts=tuple(asrs.Lift(env, 0.6, 0.3, (j*30, 0, i*12), (j*30, 10, i*12), (j*30, 0, i*12)) for j in range(4))
-        )
-        for i in range(3)),
-        depots = tuple(asrs.Depot((i*30, 0, 0)) for i in range(4)),
-        uploadTime = 20.0
-    )
+    sim = asrs.Layout().build(env, asrs.Config(Br=0.7, Bb=0.9), metrics=metrics.SUMMARY)
 
     sim.warmup (
         percentage=initFilling,
@@ -74,5 +64,5 @@ if __name__ == "__main__":
     env.run()
 
 
-    for job in sim.done:
-        print(job.kind, job.arrival, " - ", job.history["END"] - job.history["START"])
\ No newline at end of file
+    files = export.save(sim, "results.npz")
+    print(f"{len(sim.done)} completed jobs saved in", ", ".join(files))
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import uuid
+import functools
+import time
+import random
+import multiprocessing
+import concurrent.futures
+import numpy as np
+import simpy
+
+import asrs
+import algorithm
+from asrs.kind import INPUT, OUTPUT
+from asrs.source import source, Code
+from asrs import metrics
+from asrs import cache
+
+from typing import Dict, List, Optional
+
+
+# The kinds of run
+SIMULATION = "simulation"
+MULTISTART = "multistart"
+
+# The states of a run
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Seconds in a day
+DAY = 86400
+
+
+# Default data of the scenarios (the same as main.py)
+DEFAULTS = {
+    "avgArrival" : 120,
+    "Br" : 0.7,
+    "Bb" : 0.9,
+    "maxiter" : 100,
+    "seed" : 0,
+    "code_prob" : {Code(6, 1000) : 0.5, Code(3, 500) : 0.2, Code(5, 600) : 0.1, Code(3, 1000) : 0.05, Code(6, 500) : 0.05},
+    "quantity_prob" : {INPUT : {1 : 0.5, 2 : 0.5}, OUTPUT : {1 : 0.5, 2 : 0.5}},
+    "quality_prob" : {INPUT : {1 : 0.33, 2 : 0.33, 3 : 0.34}, OUTPUT : {1 : 0.33, 2 : 0.33, 3 : 0.34}},
+}
+
+
+
+def scenario (general: Dict, depots: List[Dict], **kwargs) -> Dict:
+    """
+    Method to translate the data of the tables of the web application into a scenario.
+
+    :param general: The row of the general table.
+    :param depots: The rows of the depots table.
+    :param kwargs: Other data of the scenario overriding the defaults.
+    """
+    kinds = [str(row["Type"]).lower() for row in depots]
+    probs = [float(row["Probability"]) for row in depots]
+    depot_prob = {k : {i : p for i, (kk, p) in enumerate(zip(kinds, probs)) if kk == k} for k in (INPUT, OUTPUT)}
+    result = dict(DEFAULTS, 
+        simTime = float(general["SimulationTime"]) * DAY,
+        initFilling = float(general["InitialFilling"]),
+        uploadTime = float(general["UploadingTime"]),
+        shuttle_speed = tuple(float(row["ShuttleSpeed"]) for row in depots),
+        shuttle_acceleration = tuple(float(row["ShuttleAcceleration"]) for row in depots),
+        depot_prob = depot_prob,
+        kind_prob = {k : sum(v.values()) for k, v in depot_prob.items()},
+    )
+    result.update(kwargs)
+    return result
+
+
+
+def _setup (data: Dict):
+    """ The layout and the jobs of a scenario """
+    random.seed(data["seed"])
+    np.random.seed(data["seed"])
+    layout = asrs.Layout(ndepots=len(data["shuttle_speed"]), uploadTime=data["uploadTime"],
+                         shuttle_speed=data["shuttle_speed"], shuttle_acceleration=data["shuttle_acceleration"])
+    jobs = tuple(source(simTime=data["simTime"], maxJobs=float("inf"), avgArrival=data["avgArrival"], 
+                        depot_prob=data["depot_prob"], code_prob=data["code_prob"], quantity_prob=data["quantity_prob"], 
+                        quality_prob=data["quality_prob"], kind_prob=data["kind_prob"]))
+    return layout, jobs
+
+
+
+class Stopped (Exception):
+    """ Raised inside a worker when its run has been stopped """
+    pass
+
+
+
+def _publish (progress, stopped, run_id: str, status: Dict) -> None:
+    """ Publish the progress of a run, unless the run has been stopped """
+    if run_id in stopped:
+        raise Stopped()
+    progress[run_id] = status
+
+
+
+def simulate (data: Dict, run_id: str, progress, stopped, every: float = 1.0) -> Dict:
+    """
+    A simulation of a scenario, executed by a worker process. The simulated 
+    time is published into the shared `progress` every `every` seconds (of 
+    wall clock) at most, and the simulation is interrupted if in the meanwhile 
+    the run has been stopped.
+    """
+    layout, jobs = _setup(data)
+    env = simpy.Environment()
+    sim = layout.build(env, asrs.Config(data["Br"], data["Bb"]), metrics=metrics.SUMMARY, lean=True)
+    sim.warmup(percentage=data["initFilling"], code_prob=data["code_prob"], depot_prob=data["depot_prob"], 
+               quantity_prob=data["quantity_prob"], quality_prob=data["quality_prob"])
+    env.process(sim(jobs))
+
+    horizon, last = data["simTime"], time.perf_counter()
+    _publish(progress, stopped, run_id, {"state" : RUNNING, "now" : 0.0, "horizon" : horizon})
+    # Stepping instead of running until a time, which would move the clock beyond the last event
+    while env.peek() < float("inf"):
+        env.step()
+        if (now := time.perf_counter()) - last >= every:
+            _publish(progress, stopped, run_id, {"state" : RUNNING, "now" : env.now, "horizon" : horizon})
+            last = now
+
+    _publish(progress, stopped, run_id, {"state" : RUNNING, "now" : env.now, "horizon" : horizon})
+    return sim.metrics.report()
+
+
+
+def optimize (data: Dict, run_id: str, progress, stopped) -> Dict:
+    """ 
+    A multistart of the heuristic on a scenario, executed by a worker process.
+    The multistart is interrupted after the current iteration if the run has been stopped.
+    """
+    layout, jobs = _setup(data)
+    maxiter = data["maxiter"]
+    _publish(progress, stopped, run_id, {"state" : RUNNING, "done" : 0, "total" : maxiter + 1, "best" : None})
+
+    def callback (done, best):
+        _publish(progress, stopped, run_id, {"state" : RUNNING, "done" : done, "total" : maxiter + 1, "best" : best})
+
+    best = algorithm.multistart(jobs, maxiter, lambda: data["Br"], lambda: data["Bb"], data["code_prob"], data["depot_prob"],
+                                data["quantity_prob"], data["quality_prob"], data["initFilling"], layout=layout, callback=callback)
+    return {"makespan" : best, "iterations" : maxiter + 1}
+
+
+
+class Runs (object):
+    """
+    An instance of this class executes simulations and multistarts in a pool of 
+    background processes, so that the web server is never blocked by them. Each 
+    run is identified by an id, which is used to poll its progress and result.
+
+    If a cache is given, the results of the runs are stored into it, and a run 
+    of a scenario already executed (with the same seed) is over as soon as submitted.
+
+    A forgotten run is stopped, even if it is already running, and the runs over 
+    since more than `ttl` seconds are forgotten as well.
+    """
+    def __init__(self, processes: Optional[int] = None, cache: Optional[cache.Cache] = None, ttl: float = 3600.0):
+        self.manager = multiprocessing.Manager()
+        self.progress = self.manager.dict()
+        # The ids of the runs to stop (until their worker is over)
+        self.stopped = self.manager.dict()
+        self.pool = concurrent.futures.ProcessPoolExecutor(processes)
+        self.futures: Dict[str, concurrent.futures.Future] = {}
+        # The time at which the runs were over
+        self.finished: Dict[str, float] = {}
+        self.cache = cache
+        self.ttl = ttl
+
+
+    def submit (self, kind: str, data: Dict) -> str:
+        """ Method to submit a run, which returns immediately its id """
+        self._evict()
+        run_id = uuid.uuid4().hex
+        function = {SIMULATION : simulate, MULTISTART : optimize}[kind]
+
+        if self.cache is not None:
+            k = cache.key(function, data)
+            if (result := self.cache.get(k)) is not None:
+                future = concurrent.futures.Future()
+                future.set_result(result)
+                self.futures[run_id] = future
+                self.finished[run_id] = time.monotonic()
+                return run_id
+
+        self.progress[run_id] = {"state" : QUEUED}
+        self.futures[run_id] = future = self.pool.submit(function, data, run_id, self.progress, self.stopped)
+        if self.cache is not None:
+            future.add_done_callback(functools.partial(self._store, k))
+        future.add_done_callback(functools.partial(self._finished, run_id))
+        return run_id
+
+
+    def _store (self, k: str, future: concurrent.futures.Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(k, future.result())
+
+
+    def _finished (self, run_id: str, future: concurrent.futures.Future) -> None:
+        """ Method called when the worker of a run is over """
+        self.stopped.pop(run_id, None)
+        if run_id in self.futures:
+            self.finished[run_id] = time.monotonic()
+        else:
+            # The run was forgotten while running
+            self.progress.pop(run_id, None)
+
+
+    def _evict (self) -> None:
+        """ Forget the runs over since more than ttl seconds """
+        now = time.monotonic()
+        for run_id, finished in tuple(self.finished.items()):
+            if now - finished > self.ttl:
+                self.forget(run_id)
+
+
+    def status (self, run_id: str) -> Dict:
+        """ Method to get the progress of a run, and its result once it is over """
+        self._evict()
+        future = self.futures.get(run_id)
+        if future is None:
+            return {"state" : None}
+        result = dict(self.progress.get(run_id, {}))
+        if future.cancelled():
+            result.update(state=FAILED, error="The run was cancelled.")
+        elif future.done():
+            if (error := future.exception()) is not None:
+                result.update(state=FAILED, error=repr(error))
+            else:
+                result.update(state=DONE, result=future.result())
+        return result
+
+
+    def forget (self, run_id: str) -> None:
+        """ Method to stop a run (if still queued or running) and to drop its data """
+        self.finished.pop(run_id, None)
+        if (future := self.futures.pop(run_id, None)) is not None and not future.cancel() and not future.done():
+            # The run is already executing: its worker stops as soon as it sees the flag
+            self.stopped[run_id] = True
+            if future.done():
+                self.stopped.pop(run_id, None)
+        self.progress.pop(run_id, None)
+
+
+    def shutdown (self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+        self.manager.shutdown()
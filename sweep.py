@@ -0,0 +1,223 @@
+"""
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+This file is part of the collaboration between University of Parma, Universitat 
+Oberta de Catalunya, and Matter Srl.
+
+The object of the collaboration is (i) the development of a discrete event simulation 
+for the Matt99 system (i.e., a Shuttle-Lift-Crane based Automated Storage/Retrieval 
+System sold by the company), (ii) the development of a web application so that the 
+simulation can be used by everybody (even who is not able of programming), (iii) the 
+development aand validation of a biased-randomised discrete event heuristic 
+able to improve the system performance.
+
+
+Written by: Mattia Neroni, Ph.D, Eng. (May 2020)
+Author's contact: mattianeroni@yahoo.it
+Author's website: https://mattianeroni.github.io
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+import csv
+import json
+import random
+import argparse
+import itertools
+import collections
+import multiprocessing
+import numpy as np
+import simpy
+
+import asrs
+from asrs import cache, metrics
+from asrs.kind import INPUT, OUTPUT
+from asrs.source import source
+
+import runs
+
+from typing import Dict, Iterator, List, Optional
+
+
+# Seconds in an hour
+HOUR = 3600
+
+# Example of grid (the parameters under "layout" are the ones of asrs.Layout)
+EXAMPLE = {
+    "layout" : {"nracks" : [2, 3], "ncorridors" : [20, 30], "shuttle_speed" : [2.0]},
+    "avgArrival" : [60, 90, 120],
+    "simTime" : 86400,
+    "initFilling" : 0.5,
+    "replications" : 2,
+    "Br" : 0.7,
+    "Bb" : 0.9,
+    "seed" : 0,
+}
+
+
+
+def points (grid: Dict) -> List[Dict]:
+    """
+    All the combinations of the grid, each one repeated for the number of replications. 
+    The replications with the same index have the same seed in every combination 
+    (common random numbers), so that the combinations are compared on equal terms.
+    """
+    layout = grid.get("layout", {})
+    names = sorted(layout)
+    result = []
+    for values in itertools.product(*(layout[n] for n in names)):
+        for avgArrival in grid["avgArrival"]:
+            for replication in range(grid.get("replications", 1)):
+                seed = int(np.random.SeedSequence((grid.get("seed", 0), replication)).generate_state(1)[0])
+                point = {k : v for k, v in grid.items() if k not in ("layout", "avgArrival", "replications")}
+                point.update(layout=dict(zip(names, values)), avgArrival=avgArrival, replication=replication, seed=seed)
+                result.append(point)
+    return result
+
+
+
+def run (point: Dict) -> Dict:
+    """ A simulation of a point of the grid, executed by a worker process """
+    random.seed(point["seed"])
+    np.random.seed(point["seed"])
+    layout = asrs.Layout(**point["layout"])
+
+    # Depots alternate between inputs and outputs, all with the same probability
+    n = layout.ndepots
+    depot_prob = {INPUT : {i : 1 / n for i in range(0, n, 2)}, OUTPUT : {i : 1 / n for i in range(1, n, 2)}}
+    kind_prob = {k : sum(v.values()) for k, v in depot_prob.items()}
+    data = dict(runs.DEFAULTS, depot_prob=depot_prob)
+
+    # The jobs are generated before the warmup, so they do not depend on the layout
+    jobs = tuple(source(simTime=point["simTime"], maxJobs=float("inf"), avgArrival=point["avgArrival"], 
+                        depot_prob=depot_prob, code_prob=data["code_prob"], quantity_prob=data["quantity_prob"], 
+                        quality_prob=data["quality_prob"], kind_prob=kind_prob))
+    env = simpy.Environment()
+    sim = layout.build(env, asrs.Config(point["Br"], point["Bb"]), metrics=metrics.SUMMARY, lean=True)
+    sim.warmup(percentage=point["initFilling"], code_prob=data["code_prob"], depot_prob=depot_prob, 
+               quantity_prob=data["quantity_prob"], quality_prob=data["quality_prob"])
+    env.process(sim(jobs))
+    env.run()
+
+    report = sim.metrics.report()
+    cycle = report["cycle_times"]
+    # Outputs may be split into more jobs, so the throughput counts the original jobs
+    processed = len(jobs) - report["deferred"]
+    count = sum(c["count"] for c in cycle.values())
+    return {
+        "jobs" : len(jobs),
+        "completed" : len(sim.done),
+        "horizon" : env.now,
+        "offered" : len(jobs) / point["simTime"] * HOUR,
+        "throughput" : processed / env.now * HOUR if env.now > 0 else 0.0,
+        "cycle_time" : sum(c["count"] * c["mean"] for c in cycle.values()) / count if count > 0 else None,
+        "cycle_time_input" : cycle[INPUT]["mean"] if INPUT in cycle else None,
+        "cycle_time_output" : cycle[OUTPUT]["mean"] if OUTPUT in cycle else None,
+        "max_utilisation" : max(m["utilisation"] for m in report["machines"].values()),
+        "postponed" : report["postponed"],
+        "deferred" : report["deferred"],
+    }
+
+
+
+def _run (item):
+    k, point = item
+    return k, point, run(point)
+
+
+
+def sweep (grid: Dict, path: str, processes=None) -> Iterator[Dict]:
+    """
+    Run all the points of a grid in a pool of processes. Each result is appended 
+    to the json lines file `path` as soon as it is available, and the points already 
+    in the file are not executed again, so an interrupted sweep can be resumed.
+
+    :return: A generator of the new results.
+    """
+    done = set()
+    try:
+        with open(path) as f:
+            done = {json.loads(line)["key"] for line in f if line.strip()}
+    except FileNotFoundError:
+        pass
+
+    pending = [(k, p) for p in points(grid) if (k := cache.key(p)) not in done]
+    if not pending:
+        return
+
+    with multiprocessing.Pool(processes) as pool, open(path, "a") as f:
+        for k, point, result in pool.imap_unordered(_run, pending):
+            record = {"key" : k, "point" : point, "result" : result}
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            yield record
+
+
+
+def table (path: str, grid: Optional[Dict] = None) -> Dict[str, List]:
+    """ 
+    Aggregate the results of a sweep into a single table, with one row for each 
+    combination of layout and arrival rate, averaging the replications. 
+
+    :param grid: If given, only the points of this grid are included, ignoring 
+                the results of other grids appended to the same file.
+    """
+    keys = {cache.key(p) for p in points(grid)} if grid is not None else None
+    groups = collections.defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if keys is not None and record["key"] not in keys:
+                    continue
+                point = record["point"]
+                groups[json.dumps(point["layout"], sort_keys=True), point["avgArrival"]].append(record["result"])
+
+    names = sorted({n for layout, _ in groups for n in json.loads(layout)})
+    metrics_ = ("offered", "throughput", "cycle_time", "cycle_time_input", "cycle_time_output", "max_utilisation", "postponed", "deferred")
+    columns = collections.defaultdict(list)
+    for (layout, avgArrival), results in sorted(groups.items()):
+        layout = json.loads(layout)
+        for n in names:
+            columns[n].append(layout.get(n))
+        columns["avgArrival"].append(avgArrival)
+        columns["arrival_rate"].append(HOUR / avgArrival)
+        columns["replications"].append(len(results))
+        for m in metrics_:
+            values = [r[m] for r in results if r[m] is not None]
+            columns[m].append(sum(values) / len(values) if values else None)
+    return dict(columns)
+
+
+
+def save (columns: Dict[str, List], path: str) -> None:
+    """ Write a table as csv """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(zip(*columns.values()))
+
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Parallel and resumable sweep of simulations over layouts and arrival rates.")
+    parser.add_argument("grid", nargs="?", help="The json file with the grid (by default a small example).")
+    parser.add_argument("-o", "--output", default="sweep.jsonl", help="The json lines file where the results are appended.")
+    parser.add_argument("-t", "--table", default="sweep.csv", help="The csv file where the aggregated table is written.")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="The number of worker processes (by default all the cores).")
+    args = parser.parse_args()
+
+    if args.grid is not None:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    else:
+        grid = EXAMPLE
+
+    total = len(points(grid))
+    for i, record in enumerate(sweep(grid, args.output, args.processes), 1):
+        result = record["result"]
+        cycle_time = f"{result['cycle_time']:.1f}s" if result["cycle_time"] is not None else "n/a"
+        print(f"[{i}] {record['point']['layout']} avgArrival={record['point']['avgArrival']} "
+              f"throughput={result['throughput']:.1f}/h cycle_time={cycle_time} (total points {total})")
+
+    save(table(args.output, grid), args.table)
+    print("Table saved in", args.table)